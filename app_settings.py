@@ -0,0 +1,25 @@
+import json
+import os
+
+# ==========================================
+# ⚙️ 共用設定讀取：Streamlit secrets 優先，其次本機 secrets.json
+# 頁面、get_data.py、feed_server.py、user_store.py 都從這裡讀，
+# 不在 Streamlit 裡執行的程式一樣讀得到 [catalog]、[user_store]、[feed] 等設定
+# (這個模組不 import gspread，訂閱服務的本機測試模式也能用)
+# ==========================================
+SECRETS_FILE = "secrets.json"
+
+# --- 讀取某一段設定 (例如 "user_store")，兩邊都沒有就回傳空 dict ---
+def load_settings(section):
+    try:
+        import streamlit as st
+        if section in st.secrets:
+            return dict(st.secrets[section])
+    except Exception:
+        # 不在 Streamlit 裡執行，或沒有 secrets.toml
+        pass
+
+    if os.path.exists(SECRETS_FILE):
+        with open(SECRETS_FILE, "r") as f:
+            return dict(json.load(f).get(section) or {})
+    return {}
@@ -0,0 +1,263 @@
+import hashlib
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# 📚 活動目錄共用工具 (行事曆小幫手、get_data.py 共用)
+# ==========================================
+STANDARD_COLS = ["日期", "時間", "活動名稱", "地點", "主講人", "主持人", "類型", "備註", "詳細內容"]
+KEY_COLS = ["日期", "時間", "活動名稱", "地點", "主講人", "主持人"] # 決定「是不是同一場活動」的欄位
+FACET_COLS = ["地點", "類型", "來源", "日期"] # 篩選用的分類欄位
+# 關鍵字搜尋的欄位與排序權重 (標題命中排最前面)
+SEARCH_FIELDS = {"活動名稱": 5, "主講人": 3, "主持人": 2, "地點": 2, "詳細內容": 1}
+
+# --- 正規化文字：全形轉半形、去空白，讓同一場活動不管怎麼輸入都算出同一個 Key ---
+def _normalize(series):
+    return (
+        series.fillna("").astype(str)
+        .str.normalize("NFKC")
+        .str.replace(r"\s+", " ", regex=True)
+        .str.strip()
+    )
+
+# --- 指定欄位 (前兩個是日期、時間) 正規化後的短雜湊 ---
+def _key_hashes(df, cols):
+    date = _normalize(df["日期"]).str.split(" ").str[0] # 去掉星期 "(二)"
+    time_ = _normalize(df["時間"]).str.replace("~", "-", regex=False).str.replace(" ", "", regex=False)
+    joined = date + "|" + time_
+    for col in cols[2:]:
+        joined = joined + "|" + (_normalize(df[col]) if col in df.columns else "")
+    return pd.Series(
+        [hashlib.blake2b(s.encode("utf-8"), digest_size=6).hexdigest() for s in joined],
+        index=df.index,
+    )
+
+# --- 穩定的活動 Key：依內容算出的短雜湊，不受列順序影響 ---
+# 每一列都用同一組欄位 (KEY_COLS) 算，
+# 所以一列的 Key 只看它自己的內容，不會因為別列新增、刪除或換順序而改變
+def event_keys(df):
+    keys = _key_hashes(df, KEY_COLS)
+    # 還是相同 (例如只有備註、內容不同)：每一筆都再加上「其他欄位內容」的短雜湊，
+    # 跟列順序無關，刪掉其中一筆也不會讓別筆換 Key (只剩一筆時 resolve_ids 會對回不帶後綴的 Key)
+    dup = keys.duplicated(keep=False)
+    if not dup.any(): return keys
+    cols = [c for c in STANDARD_COLS if c not in KEY_COLS and c in df.columns]
+    content = pd.Series("", index=df.index)[dup]
+    for col in cols:
+        content = content + "|" + _normalize(df.loc[dup, col])
+    keys[dup] = keys[dup] + "-" + [hashlib.blake2b(s.encode("utf-8"), digest_size=2).hexdigest() for s in content]
+    # 連其他欄位都一模一樣：再加序號 (這幾列內容完全相同，誰拿哪個序號都一樣)
+    dup_no = keys.groupby(keys).cumcount()
+    return keys.where(dup_no == 0, keys + "-" + dup_no.astype(str))
+
+# --- 日期 + 時間字串 -> 開始/結束時間 (整欄一次處理，取代逐列 strptime) ---
+# 規則與原本的 parse_datetime_range 相同：
+# "2026-02-03 (二)" + "13:00 - 14:00" -> 2026-02-03 13:00, 2026-02-03 14:00
+# 沒有 "-" 時開始=結束；先試 時:分，不行再試 時:分:秒，都不行就是 NaT
+def parse_datetime_columns(dates, times):
+    if len(dates) == 0: # 空表：字串欄位在 pandas 裡沒有型別可推，直接回傳空的時間欄
+        empty = pd.Series(pd.NaT, index=dates.index, dtype="datetime64[ns]")
+        return empty, empty.copy()
+    clean_date = dates.fillna("").astype(str).str.split(" ").str[0].str.strip()
+    clean_time = (
+        times.fillna("").astype(str)
+        .str.replace("：", ":", regex=False)
+        .str.replace("~", "-", regex=False)
+        .str.replace(" ", "", regex=False)
+    )
+    parts = clean_time.str.extract(r"^([^-]*)(?:-([^-]*))?")
+    start_txt = clean_date + " " + parts[0]
+    end_txt = clean_date + " " + parts[1].fillna(parts[0])
+
+    fmt = "%Y-%m-%d %H:%M"
+    start_dt = pd.to_datetime(start_txt, format=fmt, errors="coerce")
+    end_dt = pd.to_datetime(end_txt, format=fmt, errors="coerce")
+    ok = start_dt.notna() & end_dt.notna()
+
+    # 解析失敗的少數列才再試一次含秒數的格式
+    retry = ~ok
+    if retry.any():
+        fmt_sec = "%Y-%m-%d %H:%M:%S"
+        start_sec = pd.to_datetime(start_txt[retry], format=fmt_sec, errors="coerce")
+        end_sec = pd.to_datetime(end_txt[retry], format=fmt_sec, errors="coerce")
+        ok_sec = start_sec.notna() & end_sec.notna()
+        start_dt[retry] = start_sec.where(ok_sec)
+        end_dt[retry] = end_sec.where(ok_sec)
+    return start_dt, end_dt
+
+# --- 比對新舊兩份活動表，回傳 新增 / 內容有變 / 被移除 的活動 ---
+def diff_events(old_df, new_df, compare_cols=None):
+    compare_cols = compare_cols or [c for c in STANDARD_COLS if c in old_df.columns and c in new_df.columns]
+    old = old_df.assign(_key=event_keys(old_df)).set_index("_key") if len(old_df) else pd.DataFrame(columns=compare_cols)
+    new = new_df.assign(_key=event_keys(new_df)).set_index("_key") if len(new_df) else pd.DataFrame(columns=compare_cols)
+
+    inserted = new[~new.index.isin(old.index)]
+    removed = old[~old.index.isin(new.index)]
+
+    common = new.index[new.index.isin(old.index)]
+    old_vals = old.loc[common, compare_cols].fillna("").astype(str)
+    new_vals = new.loc[common, compare_cols].fillna("").astype(str)
+    changed = new.loc[common][(old_vals != new_vals).any(axis=1).values]
+    return inserted, changed, removed
+
+# --- 資料內容的雜湊：內容沒變，雜湊就不變 (用來當快取的 Key) ---
+def content_hash(df):
+    row_hashes = pd.util.hash_pandas_object(df, index=False).values
+    h = hashlib.blake2b(row_hashes.tobytes(), digest_size=16)
+    h.update("|".join(map(str, df.columns)).encode("utf-8"))
+    return h.hexdigest()
+
+# ==========================================
+# 🔎 關鍵字索引：中文沒有空格斷詞，改用「相鄰兩個字」(bigram) 建倒排索引
+# 查詢時先用 bigram 交集找出候選，再確認整段字真的出現 (不用 regex，特殊符號也安全)
+# ==========================================
+def _search_text(series):
+    return series.fillna("").astype(str).str.normalize("NFKC").str.lower()
+
+class SearchIndex:
+    def __init__(self, df, fields=None):
+        self.fields = {f: w for f, w in (fields or SEARCH_FIELDS).items() if f in df.columns}
+        self.texts = {f: _search_text(df[f]).tolist() for f in self.fields}
+        self.postings = {} # bigram / 單字 -> 列號集合
+        for f, texts in self.texts.items():
+            for row, text in enumerate(texts):
+                for gram in self._grams(text):
+                    self.postings.setdefault(gram, set()).add(row)
+
+    @staticmethod
+    def _grams(text):
+        grams = set(text) # 單字查詢用
+        grams.update(text[i:i + 2] for i in range(len(text) - 1))
+        grams.discard(" ")
+        return grams
+
+    def _candidates(self, term):
+        if len(term) == 1:
+            return self.postings.get(term, set())
+        rows = None
+        # 從最稀有的 bigram 開始交集，候選集合會最快縮小
+        grams = sorted({term[i:i + 2] for i in range(len(term) - 1)}, key=lambda g: len(self.postings.get(g, ())))
+        for g in grams:
+            hit = self.postings.get(g)
+            if not hit: return set()
+            rows = hit if rows is None else rows & hit
+            if not rows: return set()
+        return rows
+
+    def search(self, query):
+        """回傳 {列號: 分數}；空白分隔的多個關鍵字要全部符合"""
+        terms = unicodedata.normalize("NFKC", str(query)).lower().split()
+        if not terms: return {}
+        scores = None
+        for term in terms:
+            term_scores = {}
+            for row in self._candidates(term):
+                score = sum(w for f, w in self.fields.items() if term in self.texts[f][row])
+                if score: term_scores[row] = score
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {r: scores[r] + s for r, s in term_scores.items() if r in scores}
+            if not scores: return {}
+        return scores
+
+    def mask(self, query, n_rows):
+        hits = np.zeros(n_rows, dtype=bool)
+        rows = list(self.search(query))
+        hits[rows] = True
+        return hits
+
+# ==========================================
+# 🗂️ 整理好的活動目錄：每次資料更新只算一次，之後每次勾選都直接重用
+# ==========================================
+class PreparedCatalog:
+    def __init__(self, raw_df):
+        self.content_hash = content_hash(raw_df)
+        df = raw_df.reset_index(drop=True).copy()
+
+        # 活動 ID：由內容算出的短雜湊 (event_keys)，試算表插列、換順序都不會變
+        df["id"] = event_keys(df)
+        df["start_dt"], df["end_dt"] = parse_datetime_columns(df["日期"], df["時間"])
+        self.df = df
+        self.id_set = set(df["id"])
+
+        # 舊版 ID (日期_時間_活動名稱_列號) -> 新 ID，讓之前存的行程還認得
+        # 優先用「日期_時間_活動名稱」對應 (不受列號位移影響)，重複的才看列號
+        legacy_prefix = df["日期"].astype(str) + "_" + df["時間"].astype(str) + "_" + df["活動名稱"].astype(str)
+        unique = ~legacy_prefix.duplicated(keep=False)
+        self.legacy_prefix = dict(zip(legacy_prefix[unique], df["id"][unique]))
+        self.legacy_full = dict(zip(legacy_prefix + "_" + df.index.astype(str), df["id"]))
+        # 前一版的內容 ID 只算 日期、時間、名稱、地點 (沒有主講人、主持人)：不重複的照樣對回來
+        short_keys = _key_hashes(df, KEY_COLS[:4])
+        unique = ~short_keys.duplicated(keep=False)
+        self.legacy_short = dict(zip(short_keys[unique], df["id"][unique]))
+
+        # 分類欄位轉成 category 代碼，再展開成「每個選項一個布林遮罩」(bitmap)
+        # 篩選 = 遮罩做 OR / AND，不用再對整欄字串做 isin
+        self.codes = {}
+        self.options = {}
+        self.facets = {}
+        for col in FACET_COLS:
+            cat = pd.Categorical(df[col].astype(str))
+            self.codes[col] = cat.codes
+            self.options[col] = list(cat.categories) # 篩選選單的選項 (已排序)
+            self.facets[col] = {v: cat.codes == i for i, v in enumerate(cat.categories)}
+
+        # 每天的活動列號 (已按時間排序)
+        order = np.argsort(df["時間"].astype(str).values, kind="stable")
+        day_of = df["日期"].astype(str).values[order]
+        self.dates = sorted(set(day_of))
+        self.date_index = {d: order[day_of == d] for d in self.dates}
+        # 每天的表格也先切好，畫面上只要用篩選遮罩挑列
+        self.day_frames = {d: df.iloc[rows].reset_index(drop=True) for d, rows in self.date_index.items()}
+
+        self.search_index = SearchIndex(df)
+
+    # --- 把使用者存的 ID 換成目前的 ID (舊格式轉新格式)；認不得的原樣保留，不弄丟資料 ---
+    def resolve_ids(self, ids):
+        resolved = set()
+        for x in ids:
+            x = str(x)
+            if x not in self.id_set:
+                prefix, _, row_no = x.rpartition("_")
+                if row_no.isdigit():
+                    x = self.legacy_prefix.get(prefix) or self.legacy_full.get(x) or x
+                elif x in self.legacy_short:
+                    x = self.legacy_short[x]
+                elif x.split("-")[0] in self.id_set:
+                    x = x.split("-")[0] # 重複的活動刪到只剩一筆，Key 不再帶後綴
+            resolved.add(x)
+        return resolved
+
+    # --- 某個分類欄位「屬於任一選項」的遮罩 ---
+    def facet_mask(self, col, values):
+        bitmaps = self.facets[col]
+        mask = np.zeros(len(self.df), dtype=bool)
+        for v in values:
+            if v in bitmaps: mask |= bitmaps[v]
+        return mask
+
+    # --- 套用所有篩選，並同時算出每個選項目前有幾場 ---
+    def filter(self, selections, base_mask=None):
+        """selections: {欄位: [選項...]}，空的欄位不篩選；base_mask 例如關鍵字搜尋結果。
+        回傳 (遮罩, {欄位: {選項: 場次數}})。某欄位的場次數不套用該欄位自己的篩選，
+        所以顯示的是「勾這個選項會看到幾場」"""
+        base = np.ones(len(self.df), dtype=bool) if base_mask is None else base_mask
+        facet_masks = {col: self.facet_mask(col, vals) for col, vals in selections.items() if vals}
+
+        mask = base.copy()
+        for m in facet_masks.values():
+            mask &= m
+
+        counts = {}
+        for col, bitmaps in self.facets.items():
+            others = base.copy()
+            for c, m in facet_masks.items():
+                if c != col: others &= m
+            counts[col] = {v: int(np.count_nonzero(bm & others)) for v, bm in bitmaps.items()}
+        return mask, counts
+
+def prepare_catalog(raw_df):
+    return PreparedCatalog(raw_df)
@@ -0,0 +1,312 @@
+import abc
+import hashlib
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+from gspread.utils import absolute_range_name
+
+from app_settings import load_settings
+from catalog import STANDARD_COLS, prepare_catalog
+from gsheet_client import open_spreadsheet
+
+# ==========================================
+# 📥 活動總表讀取 (一個分頁 = 一個出版社/來源)
+# 所有分頁的內容用一次 values_batch_get 全部拿回來，不再逐頁 get_all_values
+# ==========================================
+SHEET_NAME_MASTER = "2026國際書展行事曆"
+SKIP_TABS = ["users", "工作表1", "樣板", "Sheet1"] # 不是活動資料的分頁
+
+# --- 單一分頁的原始值 (第一列是標題) -> DataFrame ---
+def tab_frame(values, tab_name):
+    if len(values) < 2: return None # 跳過沒資料的分頁
+    header = [str(c).strip() for c in values[0]]
+    # API 回傳的列不會補齊長度 (尾端空白格會省略)，用 DataFrame 建構時自動補 None
+    df = pd.DataFrame(values[1:])
+    width = max(len(header), df.shape[1])
+    header += [""] * (width - len(header))
+    df = df.reindex(columns=range(width))
+    df.columns = header
+    df = df.loc[:, [c != "" for c in header]] # 沒有標題的欄位不要
+    df = df.loc[:, ~df.columns.duplicated()]
+    if "主講人" not in df.columns and "講者" in df.columns:
+        df = df.rename(columns={"講者": "主講人"})
+    df["來源"] = tab_name # 分頁名稱就是來源 (出版社)
+    return df
+
+# --- 所有分頁合併成一張表：欄位對齊、補空字串都在合併後整欄做一次 ---
+def combine_tabs(frames):
+    frames = [f for f in frames if f is not None and not f.empty]
+    if not frames: return pd.DataFrame(columns=STANDARD_COLS + ["來源"])
+    df = pd.concat(frames, ignore_index=True, sort=False)
+    for col in STANDARD_COLS:
+        if col not in df.columns: df[col] = ""
+    return df.fillna("")
+
+# --- 分頁內容的指紋：內容沒變，指紋就不變 ---
+def tab_fingerprint(values):
+    return hashlib.blake2b(json.dumps(values, ensure_ascii=False).encode("utf-8"), digest_size=16).hexdigest()
+
+# ==========================================
+# 🔁 增量更新：先問 Drive 這份試算表最後修改時間 (1 次請求)
+# 沒人改過 -> 直接用上次的結果；有改過 -> 批次讀回所有分頁，
+# 只有指紋變了的分頁才重新整理，其他分頁沿用上次的 DataFrame 拼回去
+# (Drive 只記錄整份檔案的修改時間，看不出是哪個分頁，所以值還是一次批次讀回)
+# ==========================================
+class SheetCatalogCache:
+    def __init__(self, sheet_name):
+        self.sheet_name = sheet_name
+        self._lock = threading.Lock()
+        self.modified_time = None
+        self.tabs = {} # 分頁名稱 -> (指紋, DataFrame)
+        self.df = None
+
+    def _modified_time(self, spreadsheet):
+        try:
+            return spreadsheet.get_lastUpdateTime()
+        except Exception as e:
+            # 讀不到 (例如沒開 Drive API)：當作有變動，照樣整份批次讀
+            print(f"讀取修改時間失敗: {e}")
+            return None
+
+    def load(self):
+        with self._lock:
+            spreadsheet = open_spreadsheet(self.sheet_name)
+            if spreadsheet is None: return None, "連線失敗"
+
+            modified = self._modified_time(spreadsheet)
+            if self.df is not None and modified is not None and modified == self.modified_time:
+                return self.df, "Success"
+
+            # 1 次 metadata (分頁清單) + 1 次 values_batch_get (所有分頁的值)
+            tab_names = [ws.title for ws in spreadsheet.worksheets() if ws.title not in SKIP_TABS]
+            if not tab_names: return pd.DataFrame(), "無資料"
+            resp = spreadsheet.values_batch_get(
+                [absolute_range_name(name) for name in tab_names],
+                params={"majorDimension": "ROWS", "valueRenderOption": "FORMATTED_VALUE"},
+            )
+
+            tabs, changed = {}, []
+            for name, value_range in zip(tab_names, resp.get("valueRanges", [])):
+                values = value_range.get("values", [])
+                fingerprint = tab_fingerprint(values)
+                cached = self.tabs.get(name)
+                if cached and cached[0] == fingerprint:
+                    tabs[name] = cached
+                    continue
+                try:
+                    tabs[name] = (fingerprint, tab_frame(values, name))
+                    changed.append(name)
+                except Exception as e:
+                    print(f"分頁 {name} 讀取失敗: {e}")
+
+            if changed or self.df is None or set(tabs) != set(self.tabs):
+                self.df = combine_tabs([frame for _, frame in tabs.values()])
+                if self.modified_time is not None:
+                    print(f"活動總表有更新：{', '.join(changed) or '分頁增減'}")
+            self.tabs = tabs
+            self.modified_time = modified
+
+            if self.df.empty: return self.df, "無資料"
+            return self.df, "Success"
+
+_lock = threading.Lock()
+_caches = {} # 試算表名稱 -> SheetCatalogCache
+
+# --- 讀取整份活動總表 (回傳格式同原本的 load_master_data：(DataFrame, 訊息)) ---
+def load_sheet_catalog(sheet_name=SHEET_NAME_MASTER):
+    with _lock:
+        cache = _caches.setdefault(sheet_name, SheetCatalogCache(sheet_name))
+    return cache.load()
+
+# ==========================================
+# 🔌 活動總表來源 (可替換)：Google 試算表 / CSV / Parquet
+# 每個來源都有 load() -> (DataFrame, 訊息)；檔案類來源在檔案沒變時回傳同一個物件
+# Google 試算表是「編輯用」的來源，頁面平常讀的是硬碟上的 Parquet 快照
+# ==========================================
+BUNDLED_CSV = "2026_tibe_events_fixed.csv" # get_data.py 產生、隨程式一起部署的活動表
+BUNDLED_SOURCE_NAME = "國際書展"
+
+class SheetsSource:
+    def __init__(self, sheet_name=SHEET_NAME_MASTER):
+        self.sheet_name = sheet_name
+        self.key = f"sheets:{sheet_name}"
+
+    def load(self):
+        return load_sheet_catalog(self.sheet_name)
+
+class _FileSource(abc.ABC):
+    def __init__(self, path):
+        self.path = path
+        self.key = f"{type(self).__name__}:{os.path.abspath(path)}"
+        self._lock = threading.Lock()
+        self._df = None
+        self._mtime = None
+
+    @abc.abstractmethod
+    def _read(self):
+        """讀檔並回傳 DataFrame (子類別實作)"""
+
+    def load(self):
+        if not os.path.exists(self.path): return None, f"找不到檔案 {self.path}"
+        with self._lock:
+            mtime = os.path.getmtime(self.path)
+            if self._df is None or mtime != self._mtime:
+                self._df = self._read()
+                self._mtime = mtime
+            if self._df.empty: return self._df, "無資料"
+            return self._df, "Success"
+
+class CsvSource(_FileSource):
+    """get_data.py 輸出的 CSV (沒有「來源」欄時補上 source_name)"""
+    def __init__(self, path=BUNDLED_CSV, source_name=BUNDLED_SOURCE_NAME):
+        super().__init__(path)
+        self.source_name = source_name
+
+    def _read(self):
+        df = pd.read_csv(self.path, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+        df.columns = [str(c).strip() for c in df.columns]
+        if "來源" not in df.columns: df["來源"] = self.source_name
+        return combine_tabs([df])
+
+class ParquetSource(_FileSource):
+    """欄式儲存，整份讀進來只要幾毫秒；也是背景更新寫出的快照格式"""
+    def _read(self):
+        return pd.read_parquet(self.path)
+
+    # --- 寫入快照 (先寫暫存檔再 rename，寫到一半當機也不會留下壞檔) ---
+    def save(self, df):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, self.path)
+
+def make_source(kind, path=None):
+    kind = str(kind).lower()
+    if kind == "sheets": return SheetsSource(path or SHEET_NAME_MASTER)
+    if kind == "csv": return CsvSource(path or BUNDLED_CSV)
+    if kind == "parquet" and path: return ParquetSource(path)
+    raise ValueError(f"不支援的活動總表來源: {kind}")
+
+# ==========================================
+# ♻️ 背景更新 (stale-while-revalidate)
+# 背景執行緒每隔 REFRESH_INTERVAL 秒向「編輯用來源」(預設 Google 試算表) 檢查一次，有新資料就整份換掉；
+# 使用者永遠直接拿「最後一份成功的資料」，不用等下載。
+# 每次更新也寫一份 Parquet 快照到硬碟，頁面讀取的順序：記憶體 -> Parquet 快照 -> 編輯用來源 -> 隨附 CSV
+# ==========================================
+REFRESH_INTERVAL = 15
+SNAPSHOT_DIR = ".catalog_cache"
+
+class CatalogRefresher:
+    def __init__(self, origin, fallback=None, interval=REFRESH_INTERVAL, snapshot_dir=SNAPSHOT_DIR):
+        self.origin = origin # 編輯用來源 (背景定期檢查)
+        self.fallback = fallback # 連快照都沒有、編輯用來源又讀不到時的備援 (例如隨附的 CSV)
+        self.interval = interval
+        snapshot_name = hashlib.blake2b(origin.key.encode("utf-8"), digest_size=6).hexdigest()
+        self.snapshot = ParquetSource(os.path.join(snapshot_dir, f"{snapshot_name}.parquet"))
+        self._snapshot = None # (DataFrame, 訊息, 更新時間)：整個 tuple 一次換掉，讀的人不用上鎖
+        self._prepared = None # (快照 tuple, PreparedCatalog)：快照換了才重新整理
+        self._load_lock = threading.Lock()
+        self._prepare_lock = threading.Lock()
+        self._thread = None
+        self.last_error = None
+
+    def _load_snapshot(self):
+        try:
+            df, msg = self.snapshot.load()
+        except Exception as e:
+            print(f"快照讀取失敗: {e}")
+            return False
+        if df is None or df.empty: return False
+        self._snapshot = (df, msg, os.path.getmtime(self.snapshot.path))
+        return True
+
+    def _load_fallback(self):
+        if self.fallback is None: return False
+        try:
+            df, msg = self.fallback.load()
+        except Exception as e:
+            print(f"備援資料讀取失敗: {e}")
+            return False
+        if df is None or df.empty: return False
+        print(f"使用備援資料：{self.fallback.key}")
+        self._snapshot = (df, msg, time.time())
+        return True
+
+    # --- 讀一次編輯用來源；失敗就保留舊資料 ---
+    def refresh(self):
+        try:
+            df, msg = self.origin.load()
+        except Exception as e:
+            df, msg = None, str(e)
+        if df is None or df.empty:
+            self.last_error = msg
+            print(f"總表更新失敗 (沿用上一份資料): {msg}")
+            return False
+        self.last_error = None
+        current = self._snapshot
+        if current is None or df is not current[0]: # 沒變動時來源回傳同一個物件
+            self._snapshot = (df, msg, time.time())
+            try:
+                self.snapshot.save(df)
+            except Exception as e:
+                print(f"快照寫入失敗: {e}")
+        return True
+
+    def _run(self):
+        while True:
+            self.refresh()
+            time.sleep(self.interval)
+
+    def start(self):
+        with self._load_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"catalog-refresh-{self.origin.key}", daemon=True)
+                self._thread.start()
+
+    # --- 讀取：有資料就直接回傳，完全不碰網路 ---
+    def get(self):
+        if self._snapshot is None:
+            with self._load_lock:
+                # 硬碟快照優先；沒有快照 (第一次啟動) 才當場讀一次編輯用來源，再不行就用備援
+                if self._snapshot is None and not self._load_snapshot():
+                    if not self.refresh():
+                        self._load_fallback()
+        self.start()
+        snapshot = self._snapshot
+        if snapshot is None: return None, self.last_error or "無資料"
+        return snapshot[0], snapshot[1]
+
+    # --- 整理好的活動目錄 (ID、時間解析、索引)：每份快照只整理一次 ---
+    # 快照 tuple 本身就是版本：資料沒變時 refresh 不會換掉它，用 is 比對即可，不用每次重算整份雜湊
+    def get_prepared(self):
+        df, msg = self.get()
+        snapshot = self._snapshot
+        if df is None or snapshot is None: return None, msg
+        with self._prepare_lock:
+            if self._prepared is None or self._prepared[0] is not snapshot:
+                self._prepared = (snapshot, prepare_catalog(snapshot[0]))
+            return self._prepared[1], snapshot[1]
+
+_refreshers = {} # 來源 key -> CatalogRefresher
+
+def get_catalog_refresher(origin=None, fallback=None):
+    origin = origin or SheetsSource()
+    with _lock:
+        if origin.key not in _refreshers:
+            _refreshers[origin.key] = CatalogRefresher(origin, fallback=fallback)
+        return _refreshers[origin.key]
+
+# --- 來源設定 (secrets 的 [catalog]：origin = "sheets" / "csv" / "parquet"，path = 檔名或試算表名稱) ---
+def load_catalog_settings():
+    return load_settings("catalog")
+
+# --- 給頁面用：回傳整理好的活動目錄 (PreparedCatalog, 訊息)，總表沒變就是同一個物件 ---
+def load_prepared_catalog(sheet_name=SHEET_NAME_MASTER, fallback_csv=BUNDLED_CSV):
+    settings = load_catalog_settings()
+    kind = settings.get("origin", "sheets")
+    origin = make_source(kind, settings.get("path") or (sheet_name if kind == "sheets" else None))
+    fallback = CsvSource(fallback_csv) if fallback_csv else None
+    return get_catalog_refresher(origin, fallback).get_prepared()
@@ -0,0 +1,167 @@
+import argparse
+import hashlib
+import io
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# 🎒 匯出檔案 (ics / csv / txt)
+# 只吃已選場次的 DataFrame，回傳可以直接給 st.download_button 的內容
+# ==========================================
+CSV_COLS = ["日期", "時間", "活動名稱", "地點", "備註"]
+
+# --- 表格 (.csv，加 BOM 讓 Excel 認得中文) ---
+def build_csv(selected_df):
+    v_cols = [c for c in CSV_COLS if c in selected_df.columns]
+    return selected_df[v_cols].to_csv(index=False).encode('utf-8-sig')
+
+# --- 文字檔 (.txt)：整欄字串相加後一次 join，不逐列 += ---
+def build_txt(selected_df):
+    if selected_df.empty: return ""
+    ordered = selected_df.sort_values(by=['日期', '時間'])
+    lines = (
+        ordered['日期'].astype(str) + " " + ordered['時間'].astype(str)
+        + " | " + ordered['活動名稱'].astype(str) + " @ " + ordered['地點'].astype(str)
+    )
+    return "\n".join(lines) + "\n"
+
+# ==========================================
+# 📅 行事曆 (.ics)：整欄一次處理，不逐列建立 Event 物件
+# 活動時間是台北當地時間：整欄標上 Asia/Taipei 再轉成 UTC (取代手動減 8 小時)
+# UID 由活動 id 算出來，同一場活動每次匯出都一樣，重新匯入或訂閱更新時才不會重複
+# 下載 (build_ics) 與訂閱服務 (iter_ics，feed_server.py) 共用
+# ==========================================
+TZ = "Asia/Taipei"
+PRODID = "-//TIBE 2026//行事曆小幫手//ZH"
+UID_DOMAIN = "tibe-helper"
+CAL_NAME = "2026台北國際書展"
+
+def event_uid(event_id):
+    digest = hashlib.blake2b(str(event_id).encode("utf-8"), digest_size=10).hexdigest()
+    return f"{digest}@{UID_DOMAIN}"
+
+# --- 文字欄位跳脫 (RFC 5545：反斜線、分號、逗號、換行) ---
+def _escape(series):
+    return (
+        series.fillna("").astype(str)
+        .str.replace("\\", "\\\\", regex=False)
+        .str.replace(";", "\\;", regex=False)
+        .str.replace(",", "\\,", regex=False)
+        .str.replace("\r\n", "\\n", regex=False)
+        .str.replace("\n", "\\n", regex=False)
+    )
+
+# --- 每行最多 75 bytes，中文是 3 bytes，要在字元邊界折行 ---
+def _fold(line):
+    data = line.encode("utf-8")
+    if len(data) <= 75: return line
+    parts, start, limit = [], 0, 75
+    while len(data) - start > limit:
+        cut = start + limit
+        while data[cut] & 0xC0 == 0x80: # 不要切在多位元組字元的中間
+            cut -= 1
+        parts.append(data[start:cut])
+        start, limit = cut, 74 # 續行開頭的空白也算 1 byte
+    parts.append(data[start:])
+    return b"\r\n ".join(parts).decode("utf-8")
+
+def _fold_column(lines):
+    # 只有超過 75 bytes 的列才逐列折行 (大部分地點、短標題不用)
+    too_long = lines.str.encode("utf-8").str.len() > 75
+    if too_long.any():
+        lines = lines.copy()
+        long_lines = lines[too_long]
+        folded = {text: _fold(text) for text in long_lines.unique()} # 同名活動只折一次
+        lines[too_long] = long_lines.map(folded)
+    return lines
+
+def _utc_stamp(series):
+    utc = series.dt.tz_localize(TZ).dt.tz_convert("UTC").dt.tz_localize(None)
+    # numpy 的 datetime_as_string 比 strftime 快很多："2026-02-03T03:00:00" -> "20260203T030000Z"
+    text = np.datetime_as_string(utc.values.astype("datetime64[s]"), unit="s")
+    return pd.Series(np.char.add(np.char.replace(np.char.replace(text, "-", ""), ":", ""), "Z"), index=series.index)
+
+def _header(cal_name):
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", f"PRODID:{PRODID}", "CALSCALE:GREGORIAN", "METHOD:PUBLISH",
+             _fold(f"X-WR-CALNAME:{cal_name}"), f"X-WR-TIMEZONE:{TZ}"]
+    return "\r\n".join(lines) + "\r\n"
+
+FOOTER = "END:VCALENDAR\r\n"
+
+# --- 每場活動一段 VEVENT 文字 (Series)，全部用整欄字串運算組出來 ---
+def vevent_blocks(selected_df):
+    rows = selected_df[selected_df["start_dt"].notna() & selected_df["end_dt"].notna()]
+    if rows.empty: return pd.Series([], dtype=object)
+
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    uid = pd.Series([event_uid(x) for x in rows["id"]], index=rows.index)
+    location = _escape(rows["地點"])
+    summary = _fold_column("SUMMARY:" + _escape(rows["活動名稱"]) + " (" + location + ")")
+    return (
+        "BEGIN:VEVENT\r\nUID:" + uid
+        + "\r\nDTSTAMP:" + stamp
+        + "\r\nDTSTART:" + _utc_stamp(rows["start_dt"])
+        + "\r\nDTEND:" + _utc_stamp(rows["end_dt"])
+        + "\r\n" + summary
+        + "\r\n" + _fold_column("LOCATION:" + location)
+        + "\r\nEND:VEVENT\r\n"
+    )
+
+# --- 下載用：整份寫進同一個 buffer ---
+def build_ics(selected_df, cal_name=CAL_NAME):
+    buf = io.StringIO()
+    buf.write(_header(cal_name))
+    buf.writelines(vevent_blocks(selected_df))
+    buf.write(FOOTER)
+    return buf.getvalue()
+
+# --- 訂閱用：逐段產生 (開頭、每場一段 VEVENT、結尾)，可以邊產生邊送出 ---
+def iter_ics(selected_df, cal_name=CAL_NAME):
+    yield _header(cal_name)
+    yield from vevent_blocks(selected_df)
+    yield FOOTER
+
+# ==========================================
+# ⏱️ 效能比較：python exports.py --bench 3000
+# 跟原本 ics 套件逐列建立 Event 的寫法比較 (用全部活動重複湊到指定筆數)
+# ==========================================
+def _build_ics_with_library(selected_df):
+    from datetime import timedelta
+    from ics import Calendar, Event
+    cal_obj = Calendar()
+    for row in selected_df.to_dict("records"):
+        e = Event()
+        e.name = f"{row['活動名稱']} ({row['地點']})"
+        if row['start_dt']: e.begin = row['start_dt'] - timedelta(hours=8)
+        if row['end_dt']: e.end = row['end_dt'] - timedelta(hours=8)
+        e.location = str(row['地點'])
+        cal_obj.events.add(e)
+    return cal_obj.serialize()
+
+def bench_ics(csv_path, n_events, rounds=3):
+    from catalog import prepare_catalog
+    raw = pd.read_csv(csv_path, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+    raw["來源"] = "國際書展"
+    df = prepare_catalog(raw).df
+    df = df[df["start_dt"].notna()]
+    copies = -(-n_events // len(df))
+    big = pd.concat([df.assign(id=df["id"] + f"#{k}") for k in range(copies)], ignore_index=True).head(n_events)
+    print(f"📦 {len(big)} 場活動，各跑 {rounds} 次取最快")
+
+    for label, fn in [("ics 套件 (逐列 Event)", _build_ics_with_library), ("整欄字串 (vevent_blocks)", build_ics)]:
+        best = float("inf")
+        for _ in range(rounds):
+            t0 = time.perf_counter()
+            out = fn(big)
+            best = min(best, time.perf_counter() - t0)
+        print(f"  {label:<24} {best * 1000:8.1f} ms   {len(out.encode('utf-8')) / 1024:7.1f} KB")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="匯出檔案工具")
+    parser.add_argument("--bench", type=int, metavar="N", default=3000, help="用 N 場活動比較 ics 產生速度")
+    parser.add_argument("--csv", default="2026_tibe_events_fixed.csv")
+    args = parser.parse_args()
+    bench_ics(args.csv, args.bench)
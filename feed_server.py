@@ -0,0 +1,235 @@
+import argparse
+import hashlib
+import hmac
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote
+
+import pandas as pd
+
+from app_settings import load_settings
+from catalog import parse_datetime_columns
+from exports import iter_ics
+
+# ==========================================
+# 📡 行事曆訂閱服務 (webcal)
+# 每位使用者一個私人網址，手機/Google 日曆訂閱一次，之後自己定期來拉：
+# 內容沒變 -> 回 304 (不帶內容)；有變 -> 邊產生邊送出 (chunked)
+#
+# 啟動：python feed_server.py --port 8787
+# 本機測試 (不連 Google Sheets)：python feed_server.py --stub stub_users.csv
+# 印出某位使用者的訂閱網址：python feed_server.py --url 使用者ID
+# ==========================================
+SHEET_NAME_USERS_DB = "2026國際書展使用者行事曆"
+WORKSHEET_USERS_TAB = "users"
+USER_COLS = ["User_ID", "Password", "ID", "日期", "時間", "活動名稱", "地點"]
+SHEET_TTL = 60 # 幾秒內的訂閱請求共用同一份 users 表
+DEFAULT_PORT = 8787
+
+# --- 設定 (Streamlit secrets 的 [feed] 優先，其次 secrets.json，最後環境變數) ---
+def load_feed_settings():
+    settings = load_settings("feed")
+    settings.setdefault("secret", os.environ.get("TIBE_FEED_SECRET", ""))
+    settings.setdefault("base_url", os.environ.get("TIBE_FEED_BASE_URL", ""))
+    return settings
+
+# --- 每位使用者的網址代碼：用伺服器密鑰對 User_ID 做 HMAC，猜不到別人的網址 ---
+def feed_token(secret, user_id):
+    return hmac.new(str(secret).encode("utf-8"), str(user_id).encode("utf-8"), hashlib.sha256).hexdigest()[:24]
+
+def feed_path(secret, user_id):
+    return f"/feed/{quote(str(user_id), safe='')}/{feed_token(secret, user_id)}.ics"
+
+# --- 訂閱網址 (webcal:// 讓手機直接跳出「訂閱行事曆」) ---
+def feed_url(base_url, secret, user_id):
+    base = str(base_url).rstrip("/")
+    base = "webcal://" + base.split("://", 1)[-1]
+    return base + feed_path(secret, user_id)
+
+# ==========================================
+# 📥 行程來源：跟著 [user_store] 設定 (Google Sheets 的 users 表，或 SQLite)，本機測試讀 CSV (欄位相同)
+# 每個來源都提供 load_user(user_id)：回傳這位使用者的列 (欄位同 USER_COLS)
+# ==========================================
+def rows_of_user(df, user_id):
+    return df[df["User_ID"].astype(str).str.strip() == str(user_id)]
+
+class SheetScheduleSource:
+    def __init__(self, sheet_name=SHEET_NAME_USERS_DB, tab_name=WORKSHEET_USERS_TAB, ttl=SHEET_TTL):
+        self.sheet_name = sheet_name
+        self.tab_name = tab_name
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._df = None
+        self._loaded_at = 0.0
+
+    def _read(self):
+        from gsheet_client import get_worksheet
+        values = get_worksheet(self.sheet_name, self.tab_name).batch_get(["A:G"])[0]
+        rows = [(r + [""] * len(USER_COLS))[:len(USER_COLS)] for r in values[1:]]
+        return pd.DataFrame(rows, columns=USER_COLS)
+
+    def load(self):
+        with self._lock:
+            if self._df is None or time.time() - self._loaded_at > self.ttl:
+                self._df = self._read()
+                self._loaded_at = time.time()
+            return self._df
+
+    def load_user(self, user_id):
+        return rows_of_user(self.load(), user_id)
+
+class CsvScheduleSource:
+    """本機測試用：CSV 欄位與 users 表相同，檔案修改時間變了才重新讀"""
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._df = None
+        self._mtime = None
+
+    def load(self):
+        with self._lock:
+            mtime = os.path.getmtime(self.path)
+            if self._df is None or mtime != self._mtime:
+                df = pd.read_csv(self.path, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+                self._df = df.reindex(columns=USER_COLS).fillna("")
+                self._mtime = mtime
+            return self._df
+
+    def load_user(self, user_id):
+        return rows_of_user(self.load(), user_id)
+
+class StoreScheduleSource:
+    """[user_store] 不是 Google Sheets 時：直接讀使用者資料儲存 (SQLite 可以跟頁面同時讀寫)"""
+    def __init__(self, store):
+        self.store = store
+
+    def load_user(self, user_id):
+        return self.store.load_schedule(user_id)
+
+# --- 依 [user_store] 設定挑來源：頁面存到哪裡，訂閱就從哪裡讀 ---
+def default_schedule_source():
+    from user_store import get_user_store, load_store_settings
+    if load_store_settings().get("backend", "sheets") == "sheets":
+        return SheetScheduleSource()
+    return StoreScheduleSource(get_user_store())
+
+# --- 某位使用者的行程 (跟行事曆頁面用同一套時間解析) ---
+def user_schedule(source, user_id):
+    rows = source.load_user(user_id)
+    rows = rows[rows["ID"].astype(str).str.strip() != ""]
+    rows = rows.drop(columns=["Password"]).rename(columns={"ID": "id"})
+    rows = rows.drop_duplicates("id").sort_values(["日期", "時間"]).reset_index(drop=True)
+    rows["start_dt"], rows["end_dt"] = parse_datetime_columns(rows["日期"], rows["時間"])
+    return rows
+
+# --- ETag：只看行程內容，內容沒變 ETag 就不變 ---
+def schedule_etag(schedule):
+    h = hashlib.blake2b(digest_size=12)
+    for rec in schedule[["id", "日期", "時間", "活動名稱", "地點"]].astype(str).itertuples(index=False):
+        h.update("\x1f".join(rec).encode("utf-8"))
+        h.update(b"\x1e")
+    return f'"{h.hexdigest()}"'
+
+# ==========================================
+# 🌐 HTTP 服務
+# ==========================================
+class FeedHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # chunked 與 keep-alive 需要 1.1
+    source = None
+    secret = ""
+
+    def _send_status(self, code, message=""):
+        body = message.encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD": self.wfile.write(body)
+
+    def _write_chunk(self, text):
+        data = text.encode("utf-8")
+        if data:
+            self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        # 網址格式：/feed/<User_ID>/<token>.ics
+        parts = self.path.split("?", 1)[0].strip("/").split("/")
+        if len(parts) != 3 or parts[0] != "feed" or not parts[2].endswith(".ics"):
+            return self._send_status(404, "not found")
+        user_id = unquote(parts[1])
+        if not self.secret or not hmac.compare_digest(parts[2][:-4], feed_token(self.secret, user_id)):
+            return self._send_status(404, "not found")
+
+        try:
+            schedule = user_schedule(self.source, user_id)
+        except Exception as e:
+            print(f"讀取行程失敗: {e}")
+            return self._send_status(503, "schedule unavailable")
+
+        etag = schedule_etag(schedule)
+        if etag in [t.strip() for t in self.headers.get("If-None-Match", "").split(",")]:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        cal_name = f"2026台北國際書展 - {user_id}"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/calendar; charset=utf-8")
+        self.send_header("Content-Disposition", 'inline; filename="tibe_2026.ics"')
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache") # 可以快取，但每次都要帶 ETag 回來確認
+        if self.command == "HEAD":
+            # HEAD 只送標頭、不走 chunked：多送一個結尾 "0\r\n\r\n"，同一條連線的下一個回應就會讀錯
+            length = sum(len(chunk.encode("utf-8")) for chunk in iter_ics(schedule, cal_name=cal_name))
+            self.send_header("Content-Length", str(length))
+            self.end_headers()
+            return
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for chunk in iter_ics(schedule, cal_name=cal_name):
+            self._write_chunk(chunk)
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, fmt, *args):
+        print(f"[feed] {self.address_string()} {fmt % args}")
+
+def make_server(source, secret, host="0.0.0.0", port=DEFAULT_PORT):
+    handler = type("BoundFeedHandler", (FeedHandler,), {"source": source, "secret": secret})
+    return ThreadingHTTPServer((host, port), handler)
+
+def main():
+    parser = argparse.ArgumentParser(description="行事曆訂閱服務 (webcal)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--stub", metavar="CSV", help="改讀本機 CSV (欄位同 users 表)，不連 Google Sheets")
+    parser.add_argument("--url", metavar="USER_ID", help="印出這位使用者的訂閱網址後結束")
+    args = parser.parse_args()
+
+    settings = load_feed_settings()
+    secret = settings.get("secret")
+    if not secret:
+        print("❌ 缺少密鑰：請在 secrets 的 [feed] 設定 secret，或設定環境變數 TIBE_FEED_SECRET")
+        return
+    if args.url:
+        base_url = settings.get("base_url") or f"http://localhost:{args.port}"
+        print(feed_url(base_url, secret, args.url))
+        return
+
+    source = CsvScheduleSource(args.stub) if args.stub else default_schedule_source()
+    server = make_server(source, secret, args.host, args.port)
+    print(f"📡 訂閱服務啟動：http://{args.host}:{args.port}/feed/<User_ID>/<token>.ics")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
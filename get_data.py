@@ -1,9 +1,21 @@
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from bs4 import BeautifulSoup, SoupStrainer
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
 import pandas as pd
+import argparse
+import hashlib
+import importlib.util
+import json
+import os
+import threading
 import time
 import re
 
+from catalog import STANDARD_COLS, event_keys, diff_events
+
 # --- 1. 設定區 (已更新為 2026 日期) ---
 BASE_URL = "https://www.tibe.org.tw/tw/calendar"
 
@@ -18,6 +30,22 @@ DATE_MAP = {
     "2026-02-08 (日)": "74",
 }
 
+# --- 併發與禮貌設定 ---
+MAX_WORKERS = 8            # 同時下載的頁面數上限
+REQUESTS_PER_SECOND = 5    # 對同一個網站每秒最多幾個請求
+MAX_PAGES = 30             # 每天最多抓幾頁 (安全煞車)
+CACHE_DIR = ".scrape_cache" # 網頁快取資料夾 (ETag / Last-Modified / 解析結果)
+OUTPUT_CSV = "2026_tibe_events_fixed.csv"
+
+# --- 解析器：有裝 lxml 就用 lxml，並且只建立 .calendar-item 區塊的樹 ---
+FAST_PARSER = "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+# 比對 class 裡的每個詞 (class="calendar-item is-featured" 也算)，跟 find_all(class_="calendar-item") 的規則一樣
+ONLY_CALENDAR_ITEMS = SoupStrainer(class_=lambda c: bool(c) and "calendar-item" in str(c).split())
+
+# --- 同步到行事曆主表 (Google Sheet) ---
+SHEET_NAME_MASTER = "2026國際書展行事曆"
+MASTER_TAB = "國際書展"
+
 # --- 2. 強力清洗函式 (解決資料錯置關鍵) ---
 def clean_text(text):
     if not text:
@@ -33,117 +61,451 @@ def clean_text(text):
     text = re.sub(r'\s+', ' ', text)
     return text
 
-def scrape_single_page(url):
-    """抓取單一頁面"""
+# --- 3. 連線工具：共用連線池 + 自動重試 + 每個網站的速率限制 ---
+class HostRateLimiter:
+    """同一個網站的請求之間至少間隔 1/rate 秒 (多執行緒共用)"""
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self.lock = threading.Lock()
+        self.next_slot = {}
+
+    def wait(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+rate_limiter = HostRateLimiter(REQUESTS_PER_SECOND)
+
+def make_session():
+    session = requests.Session()
+    # 遇到 429 / 5xx 自動退避重試 (0.5s, 1s, 2s)
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504], allowed_methods=["GET"])
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=MAX_WORKERS, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+class FetchError(Exception):
+    """下載失敗 (連線錯誤、重試用完、404 以外的錯誤碼)：這一頁是「不知道內容」，不是「沒有活動」"""
+
+def fetch_page(session, url):
+    """下載單一頁面；404 (沒有這一頁) 回傳 None，其他失敗丟出 FetchError"""
     try:
-        response = requests.get(url, timeout=10)
+        rate_limiter.wait(url)
+        response = session.get(url, timeout=10)
+    except Exception as e:
+        raise FetchError(f"{url}: {e}") from e
+    if response.status_code == 404:
+        return None
+    if response.status_code != 200:
+        raise FetchError(f"{url}: HTTP {response.status_code}")
+    return response.text
+
+# --- 4. 網頁快取：條件式請求 (If-None-Match / If-Modified-Since) ---
+class PageCache:
+    """每個網址一個 JSON 檔，存 ETag、Last-Modified、內容雜湊、HTML 與解析結果。
+    網頁沒變 (304 或內容雜湊相同) 時直接沿用上次的解析結果，不再重新解析。
+    offline=True 時完全不連網，只用快取回放 (可拿存好的快取當測試資料)。"""
+    def __init__(self, cache_dir=CACHE_DIR, offline=False, enabled=True):
+        self.cache_dir = cache_dir
+        self.offline = offline
+        self.enabled = enabled or offline
+        self.lock = threading.Lock()
+        self.stats = {"hit": 0, "miss": 0}
+        if self.enabled:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode("utf-8")).hexdigest() + ".json")
+
+    def load(self, url):
+        try:
+            with open(self._path(url), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, url, entry):
+        path = self._path(url)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def fetch(self, session, url):
+        """回傳 (html, 上次的解析結果)；解析結果不是 None 代表網頁沒變，可以直接用。
+        404 回傳 (None, None)，其他失敗丟出 FetchError (快取維持原樣)"""
+        if not self.enabled:
+            return fetch_page(session, url), None
+
+        entry = self.load(url)
+        if self.offline:
+            if entry is None: return None, None
+            self._count("hit")
+            return entry["html"], entry.get("events")
+
+        headers = {}
+        if entry:
+            if entry.get("etag"): headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"): headers["If-Modified-Since"] = entry["last_modified"]
+        try:
+            rate_limiter.wait(url)
+            response = session.get(url, timeout=10, headers=headers)
+        except Exception as e:
+            raise FetchError(f"{url}: {e}") from e
+
+        if response.status_code == 304 and entry:
+            self._count("hit")
+            return entry["html"], entry.get("events")
+        if response.status_code == 404:
+            return None, None
         if response.status_code != 200:
-            return [], False
-            
-        soup = BeautifulSoup(response.text, 'html.parser')
-        items = soup.find_all(class_="calendar-item")
-        
-        if not items:
-            return [], False
+            raise FetchError(f"{url}: HTTP {response.status_code}")
 
-        page_events = []
-        for item in items:
-            title_el = item.find(class_="header-text")
-            if not title_el: continue
-            
-            # 初始化欄位
-            event_data = {
-                "日期": "", # 稍後填入
-                "時間": "", 
-                "活動名稱": clean_text(title_el.text),
-                "地點": "", 
-                "主講人": "", 
-                "主持人": "", 
-                "類型": "講座",
-                "備註": "",
-                "詳細內容": ""
-            }
-            
-            # 解析 Info 區塊 (時間/地點/主講)
-            for label in item.find_all(class_="info-name"):
-                val = label.find_next_sibling(class_="info-text")
-                if not val: val = label.find_previous_sibling(class_="info-text")
-                
-                if val:
-                    # 🔥 這裡每一項都經過 clean_text 清洗
-                    txt = clean_text(val.text)
-                    if "時間" in label.text: event_data["時間"] = txt
-                    elif "地點" in label.text: event_data["地點"] = txt
-                    elif "主講" in label.text: event_data["主講人"] = txt
-                    elif "主持" in label.text: event_data["主持人"] = txt
-            
-            # 解析詳細內容
-            desc = item.find(class_="web-editor")
-            if desc:
-                # 🔥 詳細內容最容易出事，一定要清洗換行
-                full_text = clean_text(desc.text)
-                event_data["詳細內容"] = full_text
-                # 備註只取前 30 字
-                event_data["備註"] = full_text[:30] + "..." if len(full_text) > 30 else full_text
-            
-            # 簡單類型判斷
-            name_chk = event_data["活動名稱"]
-            loc_chk = event_data["地點"]
-            if "簽書" in name_chk or "簽名" in name_chk: event_data["類型"] = "簽書會"
-            elif "直播" in loc_chk: event_data["類型"] = "直播活動"
-            elif "沙龍" in loc_chk: event_data["類型"] = "沙龍講座"
-            elif "DIY" in name_chk or "手作" in name_chk: event_data["類型"] = "手作活動"
-
-            page_events.append(event_data)
-            
-        return page_events, True
-        
-    except Exception as e:
-        print(f"⚠️ 爬蟲錯誤: {e}")
-        return [], False
+        html = response.text
+        content_hash = hashlib.sha256(html.encode("utf-8")).hexdigest()
+        unchanged = entry is not None and entry.get("content_hash") == content_hash
+        new_entry = {
+            "url": url,
+            "etag": response.headers.get("ETag", ""),
+            "last_modified": response.headers.get("Last-Modified", ""),
+            "content_hash": content_hash,
+            "html": html,
+            "events": entry.get("events") if unchanged else None,
+        }
+        self.save(url, new_entry)
+        self._count("hit" if unchanged else "miss")
+        return html, new_entry["events"]
 
-def main():
-    print("🚀 開始抓取資料 (2026 日期修正版)...")
-    all_data = []
+    def store_events(self, url, events):
+        """把解析結果寫回快取，下次網頁沒變就不用再解析"""
+        if not self.enabled or self.offline: return
+        entry = self.load(url)
+        if entry is not None:
+            entry["events"] = events
+            self.save(url, entry)
+
+    def _count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+def parse_page(html, fast=True):
+    """解析單一頁面的所有活動 (fast=False 為原本的完整 html.parser 解析，供比對用)"""
+    if fast:
+        # 頁首、選單、頁尾都不建樹，只留活動區塊
+        soup = BeautifulSoup(html, FAST_PARSER, parse_only=ONLY_CALENDAR_ITEMS)
+    else:
+        soup = BeautifulSoup(html, 'html.parser')
+    items = soup.find_all(class_="calendar-item")
     
-    for date_str, date_id in DATE_MAP.items():
-        # 只取日期部分，例如 "2026-02-03" (去除星期幾，為了 CSV 乾淨)
-        clean_date_only = date_str.split(" ")[0]
+    if not items:
+        return []
+
+    page_events = []
+    for item in items:
+        title_el = item.find(class_="header-text")
+        if not title_el: continue
         
-        print(f"\n📅 正在處理: {date_str} (ID: {date_id})")
-        page = 1
+        # 初始化欄位
+        event_data = {
+            "日期": "", # 稍後填入
+            "時間": "", 
+            "活動名稱": clean_text(title_el.text),
+            "地點": "", 
+            "主講人": "", 
+            "主持人": "", 
+            "類型": "講座",
+            "備註": "",
+            "詳細內容": ""
+        }
         
-        while True:
-            url = f"{BASE_URL}/{date_id}?page={page}"
-            # print(f"   - 抓取第 {page} 頁...") # 註解掉避免太吵
-            
-            events, has_data = scrape_single_page(url)
+        # 解析 Info 區塊 (時間/地點/主講)
+        for label in item.find_all(class_="info-name"):
+            val = label.find_next_sibling(class_="info-text")
+            if not val: val = label.find_previous_sibling(class_="info-text")
             
-            if has_data and events:
-                # 🔥 在這裡統一填入日期，絕對不會錯
-                for e in events:
-                    e['日期'] = clean_date_only
-                
-                all_data.extend(events)
-                page += 1
-                time.sleep(0.3)
-            else:
-                print(f"   ✅ 完成，共 {page-1} 頁。")
+            if val:
+                # 🔥 這裡每一項都經過 clean_text 清洗
+                txt = clean_text(val.text)
+                if "時間" in label.text: event_data["時間"] = txt
+                elif "地點" in label.text: event_data["地點"] = txt
+                elif "主講" in label.text: event_data["主講人"] = txt
+                elif "主持" in label.text: event_data["主持人"] = txt
+        
+        # 解析詳細內容
+        desc = item.find(class_="web-editor")
+        if desc:
+            # 🔥 詳細內容最容易出事，一定要清洗換行
+            full_text = clean_text(desc.text)
+            event_data["詳細內容"] = full_text
+            # 備註只取前 30 字
+            event_data["備註"] = full_text[:30] + "..." if len(full_text) > 30 else full_text
+        
+        # 簡單類型判斷
+        name_chk = event_data["活動名稱"]
+        loc_chk = event_data["地點"]
+        if "簽書" in name_chk or "簽名" in name_chk: event_data["類型"] = "簽書會"
+        elif "直播" in loc_chk: event_data["類型"] = "直播活動"
+        elif "沙龍" in loc_chk: event_data["類型"] = "沙龍講座"
+        elif "DIY" in name_chk or "手作" in name_chk: event_data["類型"] = "手作活動"
+
+        page_events.append(event_data)
+        
+    return page_events
+
+def scrape_date(fetch_pool, session, cache, date_str, date_id):
+    """抓取某一天的所有分頁：解析第 N 頁的同時，第 N+1 頁已經在下載。
+    回傳 (活動, 是否完整)：有任何一頁下載或解析失敗就是不完整，不能當成這天沒有活動"""
+    # 只取日期部分，例如 "2026-02-03" (去除星期幾，為了 CSV 乾淨)
+    clean_date_only = date_str.split(" ")[0]
+    day_events = []
+    page = 1
+    url = f"{BASE_URL}/{date_id}?page={page}"
+    pending = fetch_pool.submit(cache.fetch, session, url)
+    complete = True
+
+    while pending is not None:
+        try:
+            html, cached_events = pending.result()
+        except FetchError as e:
+            print(f"⚠️ {date_str} 第 {page} 頁下載失敗: {e}")
+            complete = False
+            break
+        # 先送出下一頁的請求，再解析這一頁
+        pending = None
+        next_url = f"{BASE_URL}/{date_id}?page={page + 1}"
+        if html and page < MAX_PAGES:
+            pending = fetch_pool.submit(cache.fetch, session, next_url)
+
+        if cached_events is not None:
+            # 網頁沒變：沿用上次的解析結果
+            events = [dict(e) for e in cached_events]
+        else:
+            try:
+                events = parse_page(html) if html else []
+            except Exception as e:
+                print(f"⚠️ {date_str} 第 {page} 頁解析失敗: {e}")
+                if pending is not None: pending.cancel()
+                complete = False
                 break
-            
-            if page > 30: break # 安全煞車
+            if html: cache.store_events(url, events)
+
+        if not events:
+            if pending is not None: pending.cancel()
+            break
+
+        # 🔥 在這裡統一填入日期，絕對不會錯
+        for e in events:
+            e['日期'] = clean_date_only
+        day_events.extend(events)
+        page += 1
+        url = next_url
+
+    if complete:
+        print(f"📅 {date_str} (ID: {date_id}) ✅ 完成，共 {page-1} 頁。")
+    else:
+        print(f"📅 {date_str} (ID: {date_id}) ❌ 沒抓完整 (只有前 {page-1} 頁)。")
+    return day_events, complete
+
+def scrape_all_dates(cache=None):
+    """所有日期同時開抓，下載總數由 MAX_WORKERS 控制。
+    回傳 (所有活動, 沒抓完整的日期清單)"""
+    cache = cache or PageCache(enabled=False)
+    session = make_session()
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as fetch_pool, \
+         ThreadPoolExecutor(max_workers=len(DATE_MAP)) as date_pool:
+        futures = [
+            date_pool.submit(scrape_date, fetch_pool, session, cache, date_str, date_id)
+            for date_str, date_id in DATE_MAP.items()
+        ]
+        # 依 DATE_MAP 的順序合併，輸出順序與以前相同
+        all_data = []
+        failed_dates = []
+        for (date_str, _), f in zip(DATE_MAP.items(), futures):
+            events, complete = f.result()
+            all_data.extend(events)
+            if not complete: failed_dates.append(date_str.split(" ")[0])
+    return all_data, failed_dates
+
+# --- 5. 增量同步：只把 新增 / 有變 / 移除 的活動寫進主表 ---
+def print_diff(inserted, changed, removed, label):
+    print(f"🔁 {label}：新增 {len(inserted)}、更新 {len(changed)}、移除 {len(removed)}")
+    for title in inserted["活動名稱"].head(5): print(f"   ＋ {title}")
+    for title in changed["活動名稱"].head(5): print(f"   ✎ {title}")
+    for title in removed["活動名稱"].head(5): print(f"   － {title}")
+
+def sync_master_sheet(df, sheet_name=SHEET_NAME_MASTER, tab_name=MASTER_TAB, skip_dates=(), prev_df=None):
+    """以主表目前的內容當作上一版，只送出差異 (批次更新 / 刪列 / 追加)。
+    prev_df：上一次爬到的活動 (上一版 CSV)。主表是人工維護的，只有「上一次爬到、這次沒有」的活動才刪；
+    手動新增、或手動改過時間地點 (Key 變了) 的列都不動。沒有上一版就一律不刪
+    skip_dates：這次沒抓完整的日期，主表上這些日期的活動一律不刪
+    (刪列會讓使用者存的活動 ID 對不到)"""
+    # 只有同步時才需要 gspread
+    from gspread.utils import rowcol_to_a1
+    from gsheet_client import append_rows_at_end, get_worksheet
+
+    ws = get_worksheet(sheet_name, tab_name, rows=1000, cols=len(STANDARD_COLS))
+    values = ws.get_all_values()
+    if not values:
+        ws.update(range_name='A1', values=[STANDARD_COLS] + df[STANDARD_COLS].values.tolist())
+        return {"inserted": len(df), "changed": 0, "removed": 0}
+
+    header = [c.strip() for c in values[0]]
+    old_df = pd.DataFrame(values[1:], columns=header)
+    for col in STANDARD_COLS:
+        if col not in old_df.columns: old_df[col] = ""
+    old_df["_row"] = range(2, len(values) + 1)
+    old_df = old_df[old_df["活動名稱"].str.strip() != ""] # 跳過空白列
+    row_of = dict(zip(event_keys(old_df), old_df["_row"]))
+
+    inserted, changed, removed = diff_events(old_df, df)
+    prev_keys = set(event_keys(prev_df)) if prev_df is not None and len(prev_df) else set()
+    manual = removed[~removed.index.isin(prev_keys)]
+    if len(manual):
+        print(f"✋ 主表上有 {len(manual)} 場活動不是上一次爬到的 (手動新增或修改過)：保留不刪")
+        removed = removed.drop(manual.index)
+    # 上一次就爬到、主表上卻找不到：多半是手動改過時間地點 (或刻意刪掉)，不要再加一份重複的回去
+    edited = inserted[inserted.index.isin(prev_keys)]
+    if len(edited):
+        print(f"✋ {len(edited)} 場活動上一次就有，但主表上找不到 (手動修改或刪除過)：不重新加入")
+        inserted = inserted.drop(edited.index)
+    if len(removed) and skip_dates:
+        kept = removed[removed["日期"].astype(str).str.strip().str.split(" ").str[0].isin(set(skip_dates))]
+        if len(kept):
+            print(f"⚠️ {', '.join(skip_dates)} 沒抓完整：保留主表上這些日期的 {len(kept)} 場活動，不刪除")
+            removed = removed.drop(kept.index)
+    print_diff(inserted, changed, removed, f"同步主表「{tab_name}」")
+
+    # 新增的列：依主表的欄位順序組出整列 (主表多出來的欄位維持空白)
+    def to_row(rec):
+        return [str(rec.get(col, "")) for col in header]
+
+    # 爬蟲有抓的欄位在主表上的位置，連續的欄位合併成一段 (例如 A:I)
+    # 更新時只寫這幾段，主表上手動維護的欄位 (來源、人工修正…) 保持原值
+    runs = []
+    for i, col in enumerate(header):
+        if col not in df.columns: continue
+        if runs and runs[-1][1] == i - 1:
+            runs[-1][1] = i
+        else:
+            runs.append([i, i])
+
+    # 1. 內容有變：原地覆寫那幾列的爬蟲欄位
+    if len(changed):
+        ws.batch_update([
+            {"range": f"{rowcol_to_a1(row_of[key], start + 1)}:{rowcol_to_a1(row_of[key], end + 1)}",
+             "values": [[str(rec.get(header[i], "")) for i in range(start, end + 1)]]}
+            for key, rec in changed.iterrows()
+            for start, end in runs
+        ])
+
+    # 2. 已移除：由下往上刪列，連續的列合併成一個請求
+    if len(removed):
+        rows = sorted((row_of[key] for key in removed.index), reverse=True)
+        spans = []
+        for r in rows:
+            if spans and spans[-1][0] == r + 1:
+                spans[-1][0] = r
+            else:
+                spans.append([r, r])
+        ws.spreadsheet.batch_update({"requests": [
+            {"deleteDimension": {"range": {
+                "sheetId": ws.id, "dimension": "ROWS", "startIndex": start - 1, "endIndex": end,
+            }}}
+            for start, end in spans
+        ]})
+
+    # 3. 新增：一次接在表尾 (刪過列之後的真正最後一列)
+    if len(inserted):
+        append_rows_at_end(ws, [to_row(rec) for _, rec in inserted.iterrows()], last_row=len(values) - len(removed))
+
+    return {"inserted": len(inserted), "changed": len(changed), "removed": len(removed)}
+
+# --- 6. 解析效能比對：用快取裡存下來的網頁 (或資料夾裡的 .html 檔) 當測試資料 ---
+def load_bench_pages(cache_dir):
+    pages = []
+    for name in sorted(os.listdir(cache_dir)):
+        path = os.path.join(cache_dir, name)
+        if name.endswith(".json"):
+            with open(path, "r", encoding="utf-8") as f:
+                pages.append(json.load(f)["html"])
+        elif name.endswith(".html"):
+            with open(path, "r", encoding="utf-8") as f:
+                pages.append(f.read())
+    return pages
+
+def bench_parse(cache_dir, rounds=5):
+    pages = load_bench_pages(cache_dir)
+    if not pages:
+        print(f"❌ {cache_dir} 裡沒有快取的網頁，請先正常執行一次")
+        return
+
+    results = {}
+    for label, fast in [("html.parser (原本)", False), (f"{FAST_PARSER} + SoupStrainer", True)]:
+        started = time.perf_counter()
+        for _ in range(rounds):
+            events = [e for html in pages for e in parse_page(html, fast=fast)]
+        elapsed = time.perf_counter() - started
+        results[fast] = events
+        print(f"⏱️ {label}: {len(events) * rounds / elapsed:,.0f} 筆/秒 ({len(pages)} 頁 x {rounds} 輪，{elapsed:.2f} 秒)")
+
+    if results[True] == results[False]:
+        print(f"✅ 兩種解析結果完全相同 (共 {len(results[True])} 筆)")
+    else:
+        diff = sum(1 for a, b in zip(results[True], results[False]) if a != b)
+        print(f"❌ 解析結果不同：{diff} 筆內容不一致，筆數 {len(results[True])} / {len(results[False])}")
+
+def main():
+    parser = argparse.ArgumentParser(description="抓取台北國際書展活動行事曆")
+    parser.add_argument("--no-cache", action="store_true", help="不使用網頁快取，每頁都重新下載與解析")
+    parser.add_argument("--offline", action="store_true", help="不連網，只用快取資料夾裡的網頁回放")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help=f"網頁快取資料夾 (預設 {CACHE_DIR})")
+    parser.add_argument("--sync", action="store_true", help=f"把差異同步到 Google Sheet「{SHEET_NAME_MASTER}」")
+    parser.add_argument("--bench", action="store_true", help="用快取裡的網頁比較新舊解析器的速度與結果 (例如 --cache-dir tests/fixtures)")
+    args = parser.parse_args()
+
+    if args.bench:
+        bench_parse(args.cache_dir)
+        return
+
+    print("🚀 開始抓取資料 (2026 日期修正版)...")
+    cache = PageCache(args.cache_dir, offline=args.offline, enabled=not args.no_cache)
+    started = time.time()
+    all_data, failed_dates = scrape_all_dates(cache)
+    print(f"⏱️ 抓取耗時 {time.time() - started:.1f} 秒")
+    if failed_dates:
+        print(f"⚠️ 這些日期沒抓完整：{', '.join(failed_dates)} (沿用上一版的資料，不當成活動被取消)")
+    if cache.enabled:
+        print(f"🗂️ 快取：{cache.stats['hit']} 頁沒變 (略過解析)，{cache.stats['miss']} 頁重新解析")
 
     # --- 輸出結果 ---
     if all_data:
         df = pd.DataFrame(all_data)
         
         # 確保欄位順序
-        cols = ["日期", "時間", "活動名稱", "地點", "主講人", "主持人", "類型", "備註", "詳細內容"]
-        df = df[cols]
+        df = df[STANDARD_COLS]
+
+        # 和上一次的 CSV 比對，列出這次有變動的活動
+        filename = OUTPUT_CSV
+        prev_df = None
+        if os.path.exists(filename):
+            prev_df = pd.read_csv(filename, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+            if failed_dates:
+                # 沒抓完整的日期：沿用上次 CSV 裡那幾天的活動
+                carry = prev_df[prev_df["日期"].str.split(" ").str[0].isin(failed_dates)]
+                df = pd.concat([df, carry[STANDARD_COLS]], ignore_index=True).sort_values("日期", kind="stable")
+            print_diff(*diff_events(prev_df, df), "與上次 CSV 相比")
         
         # 輸出 CSV
-        filename = "2026_tibe_events_fixed.csv"
         df.to_csv(filename, index=False, encoding="utf-8-sig")
+
+        if args.sync:
+            result = sync_master_sheet(df, skip_dates=failed_dates, prev_df=prev_df)
+            print(f"☁️ 主表同步完成：{result}")
         
         print("\n" + "="*30)
         print(f"🎉 抓取成功！")
@@ -0,0 +1,102 @@
+import json
+import threading
+
+import gspread
+from oauth2client.service_account import ServiceAccountCredentials
+from requests.adapters import HTTPAdapter
+
+from app_settings import SECRETS_FILE, load_settings
+
+# ==========================================
+# 🔌 共用 Google Sheets 連線
+# 行事曆、買書兩個頁面在同一個 Streamlit process 裡，
+# 這裡的連線、試算表與分頁物件整個 process 只建立一次，每次 rerun 直接重用
+# ==========================================
+SCOPE = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
+POOL_SIZE = 16 # 同時連線數上限 (多位使用者同時操作時共用)
+
+_lock = threading.RLock()
+_client = None
+_spreadsheets = {} # 試算表名稱 -> Spreadsheet
+_worksheets = {} # (試算表名稱, 分頁名稱) -> Worksheet
+_last_error = "" # 最近一次連線失敗的原因 (給頁面顯示用)
+
+# --- 讀取服務帳號金鑰 (Streamlit secrets 優先，其次本機 secrets.json) ---
+def load_service_account_info():
+    creds_dict = load_settings("gcp_service_account")
+    if not creds_dict:
+        # secrets.json 本身就是金鑰檔 (沒有包在 gcp_service_account 底下)；沒有檔案就讓錯誤往上拋
+        with open(SECRETS_FILE, "r") as f:
+            creds_dict = json.load(f)
+
+    if "private_key" in creds_dict:
+        creds_dict["private_key"] = creds_dict["private_key"].replace("\\n", "\n")
+    return creds_dict
+
+# --- 取得共用連線 (token 過期時 google-auth 會自動換新，不用重新授權) ---
+def get_gspread_client():
+    global _client, _last_error
+    with _lock:
+        if _client is not None:
+            return _client
+        try:
+            creds = ServiceAccountCredentials.from_json_keyfile_dict(load_service_account_info(), SCOPE)
+            client = gspread.authorize(creds)
+
+            # keep-alive 連線池：同一台主機的請求重用 TCP/TLS 連線
+            http = getattr(client, "http_client", client)
+            session = getattr(http, "session", None)
+            if session is not None:
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+                session.mount("https://", adapter)
+
+            _client = client
+            return _client
+        except Exception as e:
+            # 失敗不快取，下一次呼叫會重試；這裡不碰 Streamlit，要不要顯示由頁面決定
+            _last_error = str(e)
+            print(f"連線錯誤: {e}")
+            return None
+
+def last_connection_error():
+    return _last_error
+
+# --- 開啟試算表 (快取 Spreadsheet 物件，省掉每次搜尋檔案與讀 metadata) ---
+def open_spreadsheet(sheet_name):
+    with _lock:
+        if sheet_name in _spreadsheets:
+            return _spreadsheets[sheet_name]
+    client = get_gspread_client()
+    if not client: return None
+    sh = client.open(sheet_name)
+    with _lock:
+        _spreadsheets[sheet_name] = sh
+    return sh
+
+# --- 取得分頁 (找不到且有給 rows/cols 時自動建立) ---
+def get_worksheet(sheet_name, tab_name, rows=None, cols=None):
+    key = (sheet_name, tab_name)
+    with _lock:
+        if key in _worksheets:
+            return _worksheets[key]
+    sh = open_spreadsheet(sheet_name)
+    if sh is None: return None
+    try:
+        ws = sh.worksheet(tab_name)
+    except gspread.WorksheetNotFound:
+        if rows is None: raise
+        ws = sh.add_worksheet(title=tab_name, rows=rows, cols=cols or 10)
+    with _lock:
+        _worksheets[key] = ws
+    return ws
+
+# --- 在資料最後一列後面插入新列 ---
+# 不靠 append 預設從 A1 偵測表格：清空過的列會在表中間留下空白列，偵測到的表尾可能是那個空白，
+# 新資料比空白多時就會蓋到下一位使用者的列。這裡以「A 欄最後一個有值的列」為錨點，
+# 並用 INSERT_ROWS 插入新列 (同時有別人在表尾追加，也只會插在後面，不會互相覆寫)
+# last_row：呼叫端剛讀過 A 欄時直接傳入 (有值的列數)，省一次讀取
+def append_rows_at_end(ws, rows, last_row=None):
+    if not rows: return None
+    if last_row is None:
+        last_row = len(ws.col_values(1))
+    return ws.append_rows(rows, insert_data_option="INSERT_ROWS", table_range=f"A{max(last_row, 1)}")
@@ -1,6 +1,4 @@
 import streamlit as st
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
 import pandas as pd
 import time
 import re
@@ -8,6 +6,9 @@ import urllib3
 import json
 import google.generativeai as genai
 from PIL import Image
+from gsheet_client import get_gspread_client, last_connection_error
+from user_directory import get_user_directory, check_pin
+from user_store import CART_COLS, get_user_store, new_cart_key
 
 # 1. 頁面設定
 st.set_page_config(page_title="買書小幫手", page_icon="📚", layout="wide")
@@ -126,6 +127,7 @@ st.markdown("""
 # ==========================================
 SHEET_NAME = "2026國際書展使用者採購清單"
 WORKSHEET_MASTER_CART = "users" 
+# 雲端書單欄位 (CART_COLS) 定義在 user_store.py，兩種儲存方式共用
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -148,91 +150,57 @@ def configure_genai():
     except:
         return False
 
-# --- 連線功能 ---
-def get_gspread_client():
-    scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-    try:
-        if "gcp_service_account" in st.secrets:
-            creds_dict = dict(st.secrets["gcp_service_account"])
-        else:
-            with open("secrets.json", "r") as f:
-                creds_dict = json.load(f)
-                if "gcp_service_account" in creds_dict:
-                    creds_dict = creds_dict["gcp_service_account"]
-
-        if "private_key" in creds_dict:
-             creds_dict["private_key"] = creds_dict["private_key"].replace("\\n", "\n")
-        
-        creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-        return gspread.authorize(creds)
-    except Exception as e:
-        st.error(f"連線錯誤: {e}")
-        return None
+# --- 連不上 Google Sheets：畫面上顯示原因 (共用連線那邊只記 log) ---
+def show_connection_error():
+    st.error(f"連線錯誤: {last_connection_error()}")
 
 # --- 統一登入驗證 (買書版：會去檢查行事曆資料庫) ---
+# 兩邊都改查共用的帳號索引 (user_directory)，不再每次登入下載兩整張表
 def check_login(user_id, input_pin):
     # 🔥 差異點：這裡少了防止 Guest 註冊的守門員
     if str(user_id).strip().lower() == "guest":
         return False, "⚠️ 'Guest' 無法使用，請使用其他帳號！"
     
     client = get_gspread_client()
-    if not client: return False, "連線失敗"
+    if not client:
+        show_connection_error()
+        return False, "連線失敗"
     
     user_id = str(user_id).strip()
     input_pin = str(input_pin).strip()
     
     try:
         # --- 1. 連線到「買書」資料庫 (自己家) ---
-        sh_shop = client.open(SHEET_NAME) # 買書 Sheet
-        try:
-            ws_shop = sh_shop.worksheet(WORKSHEET_MASTER_CART)
-        except:
-            ws_shop = sh_shop.add_worksheet(title=WORKSHEET_MASTER_CART, rows=1000, cols=20)
-            
-        data_shop = ws_shop.get_all_values()
-        HEADERS = ["User_ID", "Password", "書名", "出版社", "定價", "折扣", "折扣價", "狀態", "備註"]
-        if not data_shop:
-            ws_shop.update(range_name='A1', values=[HEADERS])
-            data_shop = [HEADERS]
-            
-        df_shop = pd.DataFrame(data_shop[1:], columns=data_shop[0])
+        HEADERS = CART_COLS
+        shop_dir = get_user_directory(SHEET_NAME, WORKSHEET_MASTER_CART, headers=HEADERS, rows=1000, cols=20) # 買書 Sheet
 
         # --- 2. 檢查自己家是否有此帳號 ---
-        if "User_ID" in df_shop.columns:
-            user_row = df_shop[df_shop["User_ID"] == user_id]
-            if not user_row.empty:
-                # 帳號存在於買書 DB -> 驗證密碼
-                stored_pin = str(user_row.iloc[0]["Password"]).strip()
-                if stored_pin == input_pin:
-                    return True, "登入成功"
-                else:
-                    return False, "⚠️ 密碼錯誤或此帳號已存在"
+        account = shop_dir.lookup(user_id)
+        if account is not None:
+            # 帳號存在於買書 DB -> 驗證密碼
+            if check_pin(account, input_pin):
+                return True, "登入成功"
+            else:
+                return False, "⚠️ 密碼錯誤或此帳號已存在"
 
         # --- 3. 自己家沒有，去檢查「行事曆」資料庫 (鄰居家) ---
         # 防止有人用同樣帳號註冊不同密碼
         try:
             # 注意：這裡要填寫您「行事曆 App」的 Sheet 名稱
             SHEET_NAME_CAL = "2026國際書展使用者行事曆" 
-            sh_cal = client.open(SHEET_NAME_CAL)
-            ws_cal = sh_cal.worksheet("users")
-            data_cal = ws_cal.get_all_values()
-            
-            if len(data_cal) > 1:
-                df_cal = pd.DataFrame(data_cal[1:], columns=data_cal[0])
-                if "User_ID" in df_cal.columns:
-                    cal_user = df_cal[df_cal["User_ID"] == user_id]
-                    if not cal_user.empty:
-                        # 🔥 發現了！他在行事曆那邊有帳號！
-                        other_pin = str(cal_user.iloc[0]["Password"]).strip()
-                        
-                        if other_pin == input_pin:
-                            # 密碼正確 -> 自動在「買書」這邊幫他註冊 (同步)
-                            new_row = [user_id, input_pin] + [""] * (len(HEADERS) - 2)
-                            ws_shop.append_row(new_row)
-                            return True, "登入成功 (已同步行事曆帳號)"
-                        else:
-                            # 密碼錯誤 -> 禁止註冊！保護原帳號
-                            return False, "⚠️ 此帳號已在「行事曆小幫手」註冊，請輸入該帳號的正確密碼！"
+            cal_account = get_user_directory(SHEET_NAME_CAL, "users").lookup(user_id)
+            if cal_account is not None:
+                # 🔥 發現了！他在行事曆那邊有帳號！
+                if check_pin(cal_account, input_pin):
+                    # 密碼正確 -> 自動在「買書」這邊幫他註冊 (同步)
+                    new_row = [user_id, input_pin] + [""] * (len(HEADERS) - 2)
+                    account = shop_dir.register(user_id, input_pin, new_row)
+                    if not check_pin(account, input_pin):
+                        return False, "⚠️ 密碼錯誤或此帳號已存在" # 剛好被別人搶先註冊
+                    return True, "登入成功 (已同步行事曆帳號)"
+                else:
+                    # 密碼錯誤 -> 禁止註冊！保護原帳號
+                    return False, "⚠️ 此帳號已在「行事曆小幫手」註冊，請輸入該帳號的正確密碼！"
         except Exception as e:
             # 如果連不到行事曆 Sheet (例如名稱改了)，為了安全起見，這裡不阻擋，但可以印出 Log
             print(f"跨表檢查失敗: {e}")
@@ -240,135 +208,89 @@ def check_login(user_id, input_pin):
 
         # --- 4. 兩邊都沒有 -> 全新註冊 ---
         new_row = [user_id, input_pin] + [""] * (len(HEADERS) - 2)
-        ws_shop.append_row(new_row)
+        account = shop_dir.register(user_id, input_pin, new_row)
+        if not check_pin(account, input_pin):
+            return False, "⚠️ 密碼錯誤或此帳號已存在" # 剛好被別人搶先註冊
         return True, "新帳號註冊成功"
         
     except Exception as e:
         return False, f"系統錯誤: {e}"
 
-# --- 讀取使用者書單 ---
+# --- 讀取使用者書單 (存在哪裡由 user_store 決定：Google Sheets 或 SQLite) ---
 def load_user_cart(user_id):
-    client = get_gspread_client()
-    if not client: return pd.DataFrame()
     try:
-        sh = client.open(SHEET_NAME)
-        ws = sh.worksheet(WORKSHEET_MASTER_CART)
-        data = ws.get_all_values()
-        
-        if len(data) < 2: return pd.DataFrame() # 只有標題或空的
-        
-        df = pd.DataFrame(data[1:], columns=data[0])
-        
-        # 篩選該使用者的資料
-        if "User_ID" in df.columns:
-            user_df = df[df["User_ID"] == str(user_id)].copy()
-            # 移除 User_ID 和 Password 欄位，只回傳書單內容
-            cols_to_keep = ["書名", "出版社", "定價", "折扣", "折扣價", "狀態", "備註"]
-            # 確保欄位存在
-            for c in cols_to_keep:
-                if c not in user_df.columns: user_df[c] = ""
-            
-            # 🔥 關鍵修正：過濾掉「書名」為空的資料 (即過濾掉註冊時的佔位資料)
-            # 只有當「書名」有內容時，才算是一本真正的書
-            if "書名" in user_df.columns:
-                user_df = user_df[user_df["書名"].astype(str).str.strip() != ""]
-            
-            return user_df[cols_to_keep]
+        return get_user_store().load_cart(user_id)
+    except ConnectionError:
+        show_connection_error()
         return pd.DataFrame()
-    except:
+    except Exception as e:
+        print(f"讀取失敗: {e}")
         return pd.DataFrame()
 
-# --- 儲存功能 (去 Pandas 化版：完全避開 Reindexing 錯誤) ---
-def save_user_cart_to_cloud(user_id, user_pin, current_df):
-    client = get_gspread_client()
-    if not client: return False
-    try:
-        sh = client.open(SHEET_NAME)
-        ws = sh.worksheet(WORKSHEET_MASTER_CART)
-        
-        # 定義標準欄位順序
-        TARGET_COLS = ["User_ID", "Password", "書名", "出版社", "定價", "折扣", "折扣價", "狀態", "備註"]
-        
-        # 1. 讀取雲端所有資料 (取得原始 List)
-        raw_data = ws.get_all_values()
-        
-        # 準備容器：存放標題與其他人的資料
-        final_data_to_upload = []
-        
-        # 2. 處理標題與舊資料
-        if raw_data:
-            header = raw_data[0]
-            # 確保有 User_ID 欄位
-            if "User_ID" in header:
-                uid_idx = header.index("User_ID")
-                
-                # 保留標題
-                final_data_to_upload.append(TARGET_COLS) 
-                
-                # 保留「其他人」的資料 (純 List 操作)
-                for row in raw_data[1:]:
-                    # 如果這一行的 User_ID 不是我，就保留
-                    if len(row) > uid_idx and str(row[uid_idx]).strip() != str(user_id):
-                        # 這裡做一個防呆：確保這行資料長度跟標題一樣，不夠補空，太多截斷
-                        clean_row = row[:len(TARGET_COLS)] + [""] * (len(TARGET_COLS) - len(row))
-                        final_data_to_upload.append(clean_row)
-            else:
-                # 如果連 User_ID 都沒有，這張表可能是壞的，我們直接重寫標題
-                final_data_to_upload.append(TARGET_COLS)
-        else:
-            # 空表，加入標題
-            final_data_to_upload.append(TARGET_COLS)
+# --- 把書單 DataFrame 轉成雲端格式的 List (欄位順序同 CART_COLS) ---
+def cart_df_to_records(user_id, user_pin, current_df):
+    # 確保 current_df 是乾淨的
+    df_to_save = current_df.copy().reset_index(drop=True)
+    
+    if "折數" in df_to_save.columns:
+        df_to_save.rename(columns={"折數": "折扣"}, inplace=True)
+    
+    # 🔥 防呆第一道：移除重複的欄位 (這通常是報錯的主因)
+    # 如果因為之前的操作導致有兩個 "定價" 欄位，這行會只留一個
+    df_to_save = df_to_save.loc[:, ~df_to_save.columns.duplicated()]
 
-        # 3. 處理「我的新資料」
-        # 確保 current_df 是乾淨的
-        df_to_save = current_df.copy().reset_index(drop=True)
-        
-        if "折數" in df_to_save.columns:
-            df_to_save.rename(columns={"折數": "折扣"}, inplace=True)
-        
-        # 🔥 防呆第一道：移除重複的欄位 (這通常是報錯的主因)
-        # 如果因為之前的操作導致有兩個 "定價" 欄位，這行會只留一個
-        df_to_save = df_to_save.loc[:, ~df_to_save.columns.duplicated()]
+    df_to_save["User_ID"] = str(user_id)
+    df_to_save["Password"] = str(user_pin)
+    
+    # 補齊欄位
+    for col in CART_COLS:
+        if col not in df_to_save.columns: df_to_save[col] = ""
 
-        df_to_save["User_ID"] = str(user_id)
-        df_to_save["Password"] = str(user_pin)
-        
-        # 補齊欄位
-        for col in TARGET_COLS:
-            if col not in df_to_save.columns: df_to_save[col] = ""
-        
-        # -----------------------------------------------------------
-        # 🔥🔥🔥 修正版：強制數值欄位為 0 (含防錯機制) 🔥🔥🔥
-        # -----------------------------------------------------------
-        numeric_cols = ["定價", "折扣", "折扣價"]
-        for col in numeric_cols:
-            if col in df_to_save.columns:
-                # 1. 先轉成字串 (astype(str))：這能解決 "arg must be a list..." 的問題
-                #    因為不管原本是數字還是空物件，轉成字串後 Pandas 就能統一處理
-                # 2. 再轉數字 (to_numeric)
-                # 3. 最後補 0 並轉整數
-                try:
-                    df_to_save[col] = pd.to_numeric(df_to_save[col].astype(str), errors='coerce').fillna(0).astype(int)
-                except Exception as e:
-                    # 萬一真的轉不過，就強制全填 0，保證不報錯
-                    print(f"欄位 {col} 轉型失敗: {e}")
-                    df_to_save[col] = 0
-        # -----------------------------------------------------------
-
-        # 依照 TARGET_COLS 的順序排列
-        df_to_save = df_to_save[TARGET_COLS].fillna("")
-        
-        # 關鍵：把 DataFrame 轉成純 List
-        my_records_list = df_to_save.values.tolist()
-        
-        # 4. 合併 (List + List) -> 絕對不會報 Index 錯
-        final_data_to_upload.extend(my_records_list)
-        
-        # 5. 寫回 Google Sheet
-        ws.clear()
-        ws.update(range_name='A1', values=final_data_to_upload)
-        
+    # 沒有 Key 的列 (例如舊資料) 補發一個
+    no_key = df_to_save["Key"].fillna("").astype(str).str.strip() == ""
+    df_to_save.loc[no_key, "Key"] = [new_cart_key() for _ in range(int(no_key.sum()))]
+    
+    # -----------------------------------------------------------
+    # 🔥🔥🔥 修正版：強制數值欄位為 0 (含防錯機制) 🔥🔥🔥
+    # -----------------------------------------------------------
+    numeric_cols = ["定價", "折扣", "折扣價"]
+    for col in numeric_cols:
+        if col in df_to_save.columns:
+            # 1. 先轉成字串 (astype(str))：這能解決 "arg must be a list..." 的問題
+            #    因為不管原本是數字還是空物件，轉成字串後 Pandas 就能統一處理
+            # 2. 再轉數字 (to_numeric)
+            # 3. 最後補 0 並轉整數
+            try:
+                df_to_save[col] = pd.to_numeric(df_to_save[col].astype(str), errors='coerce').fillna(0).astype(int)
+            except Exception as e:
+                # 萬一真的轉不過，就強制全填 0，保證不報錯
+                print(f"欄位 {col} 轉型失敗: {e}")
+                df_to_save[col] = 0
+    # -----------------------------------------------------------
+
+    # 依照 CART_COLS 的順序排列，轉成純 List
+    return df_to_save[CART_COLS].fillna("").values.tolist()
+
+# --- 新增書籍：只追加一列，不動其他資料 ---
+def append_cart_rows(user_id, user_pin, new_rows_df):
+    try:
+        get_user_store().append_cart(user_id, user_pin, cart_df_to_records(user_id, user_pin, new_rows_df))
+        return True
+    except ConnectionError:
+        show_connection_error()
+        return False
+    except Exception as e:
+        st.error(f"儲存失敗: {str(e)}")
+        return False
+
+# --- 儲存功能 (Sheets 依 Key 只改動有變的列；SQLite 同一個交易換掉自己的書單) ---
+def save_user_cart_to_cloud(user_id, user_pin, current_df):
+    try:
+        get_user_store().save_cart(user_id, user_pin, cart_df_to_records(user_id, user_pin, current_df))
         return True
+    except ConnectionError:
+        show_connection_error()
+        return False
     except Exception as e:
         st.error(f"儲存失敗: {str(e)}")
         return False
@@ -438,7 +360,8 @@ def submit_book_callback():
         "折數": val_discount,
         "折扣價": calc_final,
         "狀態": "待購", 
-        "備註": val_note
+        "備註": val_note,
+        "Key": new_cart_key()
     }])
 
     # 更新 Session
@@ -449,7 +372,8 @@ def submit_book_callback():
     
     # 存檔與設定回饋訊息
     if not st.session_state.get("is_guest", False):
-        save_user_cart_to_cloud(st.session_state.user_id, st.session_state.user_pin, st.session_state.cart_data)
+        # 只追加這一本，不重寫整份書單
+        append_cart_rows(st.session_state.user_id, st.session_state.user_pin, new_row)
         # 🔥 修改：將成功訊息存入 session_state
         st.session_state.add_msg = {"type": "success", "text": f"✅ 已加入願望書單：{val_title}"}
     else:
@@ -585,7 +509,7 @@ st.caption("請先輸入書籍資料，之後可在願望書單修改與刪除
 
 # 確保 cart_data 是最新的 DataFrame
 df = st.session_state.cart_data
-expected_cols = ["書名", "出版社", "定價", "折扣", "折扣價", "狀態", "備註"]
+expected_cols = ["書名", "出版社", "定價", "折扣", "折扣價", "狀態", "備註", "Key"]
 for c in expected_cols:
     if c not in df.columns: df[c] = "" 
 
@@ -738,7 +662,7 @@ else:
     df_display.insert(0, "刪除", False)
     
     # 3. 🔥 關鍵修改：強制定義欄位顯示順序 (已購放在刪除與書名中間)
-    cols_to_show = ["刪除", "已購", "書名", "出版社", "定價", "折數", "折扣價", "備註"]
+    cols_to_show = ["刪除", "已購", "書名", "出版社", "定價", "折數", "折扣價", "備註", "Key"]
     
     # 表格設定
     edited_df = st.data_editor(
@@ -758,6 +682,8 @@ else:
             "折扣價": st.column_config.NumberColumn("售價", format="$%d", width="small", disabled=True),
             # "狀態" 欄位已不再顯示，改用 "已購"
             "備註": st.column_config.TextColumn("備註", width="small"),
+            # Key 隱藏不顯示，儲存時用來對應雲端的列
+            "Key": None,
         }
     )
     
@@ -0,0 +1,133 @@
+import bisect
+import heapq
+import re
+
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# 🧭 行程工具：衝堂檢查、不衝堂建議
+# ==========================================
+
+# --- 場館分區與步行時間 (分鐘，估計值，可依現場動線調整) ---
+# 攤位編號開頭的字母就是世貿一館的區域 (A/B/C/D)，各沙龍與主題館集中在同一區
+SALON_KEYWORDS = ["沙龍", "主題廣場", "直播室", "主題國館", "法國館"]
+SAME_VENUE_MINUTES = 0
+SAME_ZONE_MINUTES = 5
+ZONE_MINUTES = {
+    ("A", "B"): 5, ("B", "C"): 5, ("C", "D"): 5,
+    ("A", "C"): 10, ("B", "D"): 10, ("A", "D"): 15,
+    ("S", "A"): 10, ("S", "B"): 10, ("S", "C"): 10, ("S", "D"): 10,
+}
+DEFAULT_MINUTES = 10 # 判斷不出分區時
+MAX_TRAVEL_MINUTES = max(list(ZONE_MINUTES.values()) + [SAME_ZONE_MINUTES, DEFAULT_MINUTES])
+
+BOOTH_RE = re.compile(r"([A-D])\d{3,4}")
+
+def venue_zone(location):
+    loc = str(location)
+    m = BOOTH_RE.search(loc)
+    if m: return m.group(1)
+    if any(k in loc for k in SALON_KEYWORDS): return "S"
+    return None
+
+def travel_minutes(loc_a, loc_b):
+    if str(loc_a).strip() == str(loc_b).strip(): return SAME_VENUE_MINUTES
+    za, zb = venue_zone(loc_a), venue_zone(loc_b)
+    if za is None or zb is None: return DEFAULT_MINUTES
+    if za == zb: return SAME_ZONE_MINUTES
+    return ZONE_MINUTES.get((za, zb), ZONE_MINUTES.get((zb, za), DEFAULT_MINUTES))
+
+def _as_minutes(series):
+    # datetime64 -> 從 epoch 起算的分鐘數 (整數運算比 Timestamp 比較快很多)
+    return series.values.astype("datetime64[m]").astype(np.int64)
+
+# --- 衝堂檢查：依開始時間排序後掃描 (sweep)，O(n log n) ---
+def find_conflicts(df, with_travel=True):
+    """df 需要 id / start_dt / end_dt / 地點 欄位。
+    回傳 [(先開始的 id, 後開始的 id), ...]：後一場在「前一場結束 + 步行時間」之前就開始"""
+    df = df[df["start_dt"].notna() & df["end_dt"].notna()]
+    if len(df) < 2: return []
+
+    starts = _as_minutes(df["start_dt"])
+    ends = _as_minutes(df["end_dt"])
+    ids = df["id"].tolist()
+    locs = df["地點"].astype(str).tolist()
+    order = np.argsort(starts, kind="stable")
+    slack = MAX_TRAVEL_MINUTES if with_travel else 0
+
+    pairs = []
+    active = [] # (結束 + 最長步行時間, 列號)：只有還可能撞到後面場次的才留著
+    for j in order:
+        while active and active[0][0] <= starts[j]:
+            heapq.heappop(active)
+        for _, i in active:
+            walk = travel_minutes(locs[i], locs[j]) if with_travel else 0
+            if starts[j] < ends[i] + walk:
+                pairs.append((ids[i], ids[j]))
+        heapq.heappush(active, (ends[j] + slack, j))
+    return pairs
+
+# --- 不衝堂建議：保留最多場 ---
+# 「最早結束先挑」只有在不算步行時間時才保證最多場；加上分區步行時間後可能少排，
+# 所以直接用下面的自動排行程 DP，每場都給 1 分 (總分 = 場數)
+def suggest_non_conflicting(df, with_travel=True):
+    keep, _ = plan_itinerary(df, np.ones(len(df)), with_travel)
+    return keep
+
+# --- 場館代碼 + 步行時間表 (場館數很少，先算好整張表，DP 裡只查表) ---
+def _travel_table(locations, with_travel=True):
+    codes, venues = pd.factorize(locations.astype(str))
+    size = len(venues)
+    if not with_travel:
+        return codes, [[0] * size for _ in range(size)]
+    return codes, [[travel_minutes(a, b) for b in venues] for a in venues]
+
+# ==========================================
+# 🗺️ 自動排行程：加權區間排程 (weighted interval scheduling)
+# 依結束時間排序後做 DP：best[j] = 以第 j 場收尾的最高總分
+# 比「結束 + 最長步行時間」還早結束的場次一定趕得上，直接查前綴最大值 (二分搜尋)；
+# 只有結束時間落在步行緩衝內的少數場次才需要逐一檢查步行時間
+# ==========================================
+def plan_itinerary(df, weights, with_travel=True):
+    """weights：每列的分數 (與 df 同長度，0 以下的場次不排)。
+    回傳 (排進行程的 id 清單 (依時間排序), 總分)"""
+    weights = np.asarray(weights, dtype=float)
+    ok = (df["start_dt"].notna() & df["end_dt"].notna()).values & (weights > 0)
+    df, weights = df[ok], weights[ok]
+    if df.empty: return [], 0.0
+
+    order = np.lexsort((_as_minutes(df["start_dt"]), _as_minutes(df["end_dt"])))
+    starts = _as_minutes(df["start_dt"])[order].tolist()
+    ends = _as_minutes(df["end_dt"])[order].tolist()
+    w = weights[order].tolist()
+    ids = df["id"].values[order].tolist()
+    loc_codes, walk = _travel_table(df["地點"], with_travel)
+    locs = loc_codes[order].tolist()
+    slack = MAX_TRAVEL_MINUTES if with_travel else 0
+
+    n = len(ids)
+    best = [0.0] * n
+    prev = [-1] * n
+    pref_val = [0.0] * n # best[0..k] 的最大值
+    pref_arg = [-1] * n
+    for j in range(n):
+        # 結束時間 <= 開始 - 最長步行時間：不管在哪個場館都趕得上
+        safe = min(bisect.bisect_right(ends, starts[j] - slack), j)
+        top, arg = (pref_val[safe - 1], pref_arg[safe - 1]) if safe else (0.0, -1)
+        for i in range(safe, j):
+            if ends[i] + walk[locs[i]][locs[j]] <= starts[j] and best[i] > top:
+                top, arg = best[i], i
+        best[j] = w[j] + top
+        prev[j] = arg
+        if j and pref_val[j - 1] >= best[j]:
+            pref_val[j], pref_arg[j] = pref_val[j - 1], pref_arg[j - 1]
+        else:
+            pref_val[j], pref_arg[j] = best[j], j
+
+    chosen = []
+    k = pref_arg[-1]
+    while k != -1:
+        chosen.append(ids[k])
+        k = prev[k]
+    return chosen[::-1], pref_val[-1]
@@ -0,0 +1,125 @@
+import re
+
+# ==========================================
+# 🧪 假的 gspread Worksheet (只在記憶體裡)
+# 只實作頁面用到的呼叫；append_rows 照 Sheets 的規則偵測表格：
+# 從錨點列往下找連續有資料的列，寫在表尾的下一列 (預設錨點 A1，OVERWRITE 直接覆寫)
+# ==========================================
+CELL_RE = re.compile(r"^([A-Z]*)(\d*)$")
+
+def _col_index(letters):
+    n = 0
+    for ch in letters:
+        n = n * 26 + ord(ch) - 64
+    return n
+
+def _parse_range(rng, max_row):
+    # "A5:G7"、"A:A"、"1:1"、"A12:B" -> (第一列, 最後一列, 第一欄, 最後一欄)，欄列都從 1 起算
+    rng = rng.split("!")[-1]
+    first, _, last = rng.partition(":")
+    last = last or first
+    c1, r1 = CELL_RE.match(first).groups()
+    c2, r2 = CELL_RE.match(last).groups()
+    return (int(r1) if r1 else 1, int(r2) if r2 else max_row,
+            _col_index(c1) if c1 else 1, _col_index(c2) if c2 else 10 ** 6)
+
+def _trim(row):
+    row = [str(v) for v in row]
+    while row and row[-1] == "":
+        row.pop()
+    return row
+
+class FakeSpreadsheet:
+    """只支援 deleteDimension (刪列)"""
+    def __init__(self, worksheet):
+        self.worksheet = worksheet
+
+    def batch_update(self, body):
+        self.worksheet.calls.append(("spreadsheet.batch_update", body))
+        for req in body["requests"]:
+            rng = req["deleteDimension"]["range"]
+            del self.worksheet.rows[rng["startIndex"]:rng["endIndex"]]
+
+class FakeWorksheet:
+    def __init__(self, rows=None, title="users"):
+        self.id = 0
+        self.title = title
+        self.rows = [_trim(r) for r in (rows or [])]
+        self.calls = []
+        self.spreadsheet = FakeSpreadsheet(self)
+
+    # --- 讀取 ---
+    def _read(self, rng):
+        r1, r2, c1, c2 = _parse_range(rng, len(self.rows))
+        values = [_trim(self.rows[r - 1][c1 - 1:c2]) if r <= len(self.rows) else [] for r in range(r1, r2 + 1)]
+        while values and not values[-1]:
+            values.pop()
+        return values
+
+    def batch_get(self, ranges):
+        self.calls.append(("batch_get", list(ranges)))
+        return [self._read(rng) for rng in ranges]
+
+    def get_all_values(self):
+        self.calls.append(("get_all_values",))
+        width = max([len(r) for r in self.rows] + [0])
+        return [r + [""] * (width - len(r)) for r in self._read("A1:ZZ")]
+
+    def col_values(self, col):
+        self.calls.append(("col_values", col))
+        values = [r[col - 1] if len(r) >= col else "" for r in self.rows]
+        while values and values[-1] == "":
+            values.pop()
+        return values
+
+    # --- 寫入 ---
+    def _write(self, r1, c1, values):
+        for offset, row in enumerate(values):
+            r = r1 + offset
+            while len(self.rows) < r:
+                self.rows.append([])
+            current = self.rows[r - 1] + [""] * max(0, c1 - 1 + len(row) - len(self.rows[r - 1]))
+            current[c1 - 1:c1 - 1 + len(row)] = [str(v) for v in row]
+            self.rows[r - 1] = _trim(current)
+
+    def update(self, range_name, values):
+        self.calls.append(("update", range_name))
+        r1, _, c1, _ = _parse_range(range_name, len(self.rows))
+        self._write(r1, c1, values)
+
+    def batch_update(self, data):
+        self.calls.append(("batch_update", [d["range"] for d in data]))
+        for d in data:
+            r1, _, c1, _ = _parse_range(d["range"], len(self.rows))
+            self._write(r1, c1, d["values"])
+
+    def batch_clear(self, ranges):
+        self.calls.append(("batch_clear", list(ranges)))
+        for rng in ranges:
+            r1, r2, c1, c2 = _parse_range(rng, len(self.rows))
+            for r in range(r1, min(r2, len(self.rows)) + 1):
+                row = self.rows[r - 1]
+                self.rows[r - 1] = _trim(row[:c1 - 1] + [""] * max(0, min(c2, len(row)) - c1 + 1) + row[c2:])
+
+    def append_rows(self, values, value_input_option="RAW", insert_data_option=None, table_range=None, **kwargs):
+        self.calls.append(("append_rows", insert_data_option, table_range))
+        anchor = _parse_range(table_range, len(self.rows))[0] if table_range else 1
+        filled = lambda r: r <= len(self.rows) and bool(self.rows[r - 1])
+        target = anchor
+        if filled(anchor):
+            while filled(target + 1):
+                target += 1
+            target += 1
+        if insert_data_option == "INSERT_ROWS":
+            while len(self.rows) < target - 1:
+                self.rows.append([])
+            self.rows[target - 1:target - 1] = [[] for _ in values]
+        self._write(target, 1, values)
+        return {"updates": {"updatedRange": f"'{self.title}'!A{target}:J{target + len(values) - 1}"}}
+
+    def append_row(self, values, **kwargs):
+        return self.append_rows([values], **kwargs)
+
+    # --- 測試用 ---
+    def rows_of(self, user_id):
+        return [(i + 1, r) for i, r in enumerate(self.rows) if r and r[0] == user_id]
@@ -0,0 +1,25 @@
+import json
+
+import catalog_source
+import feed_server
+import user_store
+from app_settings import load_settings
+
+# --- 不在 Streamlit 裡執行 (get_data.py、feed_server.py)：每一段設定都從 secrets.json 讀 ---
+def test_sections_fall_back_to_secrets_json(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("TIBE_FEED_SECRET", raising=False)
+    (tmp_path / "secrets.json").write_text(json.dumps({
+        "catalog": {"origin": "parquet", "path": "catalog.parquet"},
+        "user_store": {"backend": "sqlite", "mirror": "false"},
+        "feed": {"secret": "s3cret"},
+    }), encoding="utf-8")
+
+    assert catalog_source.load_catalog_settings() == {"origin": "parquet", "path": "catalog.parquet"}
+    assert user_store.load_store_settings() == {"backend": "sqlite", "mirror": "false"}
+    assert feed_server.load_feed_settings() == {"secret": "s3cret", "base_url": ""}
+    assert load_settings("gemini") == {}
+
+def test_missing_secrets_json_means_defaults(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert load_settings("catalog") == {}
@@ -0,0 +1,144 @@
+import hashlib
+import random
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from catalog import SEARCH_FIELDS, STANDARD_COLS, SearchIndex, event_keys, prepare_catalog
+
+def catalog_frame(*rows):
+    recs = []
+    for date, time_, title, place, speaker, note in rows:
+        rec = dict.fromkeys(STANDARD_COLS, "")
+        rec.update({"日期": date, "時間": time_, "活動名稱": title, "地點": place, "主講人": speaker,
+                    "備註": note, "類型": "講座", "來源": "國際書展"})
+        recs.append(rec)
+    return pd.DataFrame(recs)
+
+BASE = [
+    ("2026-02-03 (二)", "10:00 - 11:00", "新書發表", "紅沙龍", "王小明", ""),
+    ("2026-02-03 (二)", "13:00 - 14:00", "集章活動", "A101", "", "第一輪"),
+    ("2026-02-03 (二)", "13:00 - 14:00", "集章活動", "A101", "", "第二輪"),
+    ("2026-02-03 (二)", "13:00 - 14:00", "集章活動", "A101", "", "第三輪"),
+    ("2026-02-04 (三)", "15:00 - 16:00", "繪本工作坊", "兒童館", "李大同", ""),
+]
+
+def ids_by_row(df):
+    return dict(zip(map(tuple, df[STANDARD_COLS].values.tolist()), event_keys(df)))
+
+# --- 插入同時段同名的活動、刪除其中一輪、換順序，既有活動的 ID 都不變 ---
+def test_event_keys_stable_when_rows_change():
+    before = ids_by_row(catalog_frame(*BASE))
+    assert len(set(before.values())) == len(BASE)
+
+    edited = [
+        ("2026-02-03 (二)", "10:00 - 11:00", "新書發表", "紅沙龍", "陳小華", ""), # 同一時段同名，主講人不同
+        ("2026-02-03 (二)", "13:00 - 14:00", "集章活動", "A102", "", "第一輪"), # 同名，地點不同
+    ] + BASE[::-1]
+    after = ids_by_row(catalog_frame(*edited))
+    assert {k: after[k] for k in before} == before
+
+    removed = ids_by_row(catalog_frame(*(BASE[:2] + BASE[3:])))
+    assert removed == {k: before[k] for k in removed}
+
+# --- 全形/半形、多餘空白不影響 ID ---
+def test_event_keys_normalize_text():
+    a = catalog_frame(("2026-02-03 (二)", "10:00 - 11:00", "新書發表", "紅沙龍", "王小明", ""))
+    b = catalog_frame(("2026-02-03", "10:00~11:00", "新書發表 ", "紅沙龍", "王小明", ""))
+    assert event_keys(a).tolist() == event_keys(b).tolist()
+
+# --- 舊版 ID (日期_時間_活動名稱_列號) 換成新 ID；重複的名稱看列號，認不得的原樣保留 ---
+def test_resolve_ids_maps_legacy_ids():
+    catalog = prepare_catalog(catalog_frame(*BASE))
+    ids = catalog.df["id"].tolist()
+    legacy = [f"{d}_{t}_{title}_{i}" for i, (d, t, title, *_rest) in enumerate(BASE)]
+
+    shifted = legacy[0].rsplit("_", 1)[0] + "_7" # 名稱唯一：列號位移也認得
+    assert catalog.resolve_ids([shifted, legacy[2], legacy[1], ids[4], "unknown_id"]) == {
+        ids[0], ids[2], ids[1], ids[4], "unknown_id",
+    }
+
+# --- 前一版只用 日期/時間/名稱/地點 算的 ID 也認得 ---
+def test_resolve_ids_maps_previous_content_ids():
+    catalog = prepare_catalog(catalog_frame(*BASE))
+    old_id = hashlib.blake2b("2026-02-03|10:00-11:00|新書發表|紅沙龍".encode("utf-8"), digest_size=6).hexdigest()
+    assert catalog.resolve_ids([old_id]) == {catalog.df["id"][0]}
+
+# --- 重複的活動刪到只剩一筆：原本帶後綴的 ID 對回不帶後綴的 ID ---
+def test_resolve_ids_drops_duplicate_suffix():
+    before = prepare_catalog(catalog_frame(*BASE))
+    after = prepare_catalog(catalog_frame(BASE[0], BASE[1], BASE[4]))
+    assert "-" in before.df["id"][1]
+    assert after.resolve_ids([before.df["id"][1]]) == {after.df["id"][1]}
+
+# ==========================================
+# 🔎 關鍵字索引：結果要跟逐列做子字串比對一樣 (含 regex 特殊符號)
+# ==========================================
+def scan(df, query):
+    terms = unicodedata.normalize("NFKC", query).lower().split()
+    texts = {f: df[f].fillna("").astype(str).str.normalize("NFKC").str.lower() for f in SEARCH_FIELDS}
+    return {row for row in range(len(df))
+            if terms and all(any(t in texts[f].iloc[row] for f in SEARCH_FIELDS) for t in terms)}
+
+def test_search_matches_substring_scan():
+    rng = random.Random(11)
+    words = ["書展", "講座", "(下午場)", "[線上]", "C++", "a.b", "*精選*", "ＡＩ", "繪本", "作家", "?", "簽書會", "台北"]
+    recs = []
+    for _ in range(120):
+        rec = dict.fromkeys(STANDARD_COLS, "")
+        for f in SEARCH_FIELDS:
+            rec[f] = " ".join(rng.sample(words, rng.randint(0, 3))).replace(" ", rng.choice(["", " "]))
+        recs.append(rec)
+    df = pd.DataFrame(recs)
+    index = SearchIndex(df)
+
+    queries = ["(", "(下午", "[線上]", "c++", "a.b", "*", "ai", "書展 講座", "繪本作家", "?", "書", "不存在", "場) [線"]
+    for query in queries:
+        assert set(index.search(query)) == scan(df, query), query
+
+# --- 標題命中的分數比只有內容命中高 ---
+def test_search_ranks_title_hits_first():
+    df = catalog_frame(
+        ("2026-02-03", "10:00 - 11:00", "繪本工作坊", "兒童館", "", ""),
+        ("2026-02-03", "11:00 - 12:00", "親子講座", "兒童館", "繪本作家", ""),
+    )
+    scores = SearchIndex(df).search("繪本")
+    assert scores[0] > scores[1] > 0
+
+# ==========================================
+# 🗂️ 分類篩選：某欄位的場次數不套用該欄位自己的篩選
+# ==========================================
+def facet_frame():
+    rng = random.Random(3)
+    recs = []
+    for i in range(60):
+        rec = dict.fromkeys(STANDARD_COLS, "")
+        rec.update({"日期": rng.choice(["2026-02-03", "2026-02-04"]), "時間": f"{9 + i % 8}:00 - {10 + i % 8}:00",
+                    "活動名稱": f"活動 {i}", "地點": rng.choice(["紅沙龍", "藍沙龍", "B412"]),
+                    "類型": rng.choice(["講座", "簽書會", "手作活動"]), "來源": rng.choice(["國際書展", "出版社"])})
+        recs.append(rec)
+    return pd.DataFrame(recs)
+
+def test_filter_counts_exclude_own_selection():
+    df = facet_frame()
+    catalog = prepare_catalog(df)
+    selections = {"地點": ["紅沙龍", "B412"], "類型": ["講座"], "來源": []}
+    base = np.arange(len(df)) % 3 != 0 # 例如關鍵字搜尋的結果
+
+    mask, counts = catalog.filter(selections, base)
+
+    in_loc, in_type = df["地點"].isin(selections["地點"]), df["類型"].isin(selections["類型"])
+    assert mask.tolist() == (base & in_loc & in_type).tolist()
+    # 地點的場次數：套用類型篩選，不套用地點自己的篩選 (所以沒勾的藍沙龍也看得到數字)
+    assert counts["地點"] == df[base & in_type]["地點"].value_counts().reindex(catalog.options["地點"], fill_value=0).to_dict()
+    assert counts["類型"] == df[base & in_loc]["類型"].value_counts().reindex(catalog.options["類型"], fill_value=0).to_dict()
+    # 沒勾選的欄位：兩個篩選都套用
+    assert counts["來源"] == df[base & in_loc & in_type]["來源"].value_counts().reindex(catalog.options["來源"], fill_value=0).to_dict()
+    assert counts["地點"]["藍沙龍"] > 0
+
+def test_filter_without_selections_keeps_everything():
+    catalog = prepare_catalog(facet_frame())
+    mask, counts = catalog.filter({})
+    assert mask.all()
+    assert sum(counts["日期"].values()) == len(catalog.df)
@@ -0,0 +1,34 @@
+import pandas as pd
+
+from catalog import STANDARD_COLS
+from catalog_source import CatalogRefresher
+
+def catalog_frame(title):
+    rec = dict.fromkeys(STANDARD_COLS, "")
+    rec.update({"日期": "2026-02-03", "時間": "10:00-11:00", "活動名稱": title, "地點": "紅沙龍", "類型": "講座", "來源": "國際書展"})
+    return pd.DataFrame([rec])
+
+class FakeOrigin:
+    key = "fake-origin"
+
+    def __init__(self, df):
+        self.df = df
+
+    def load(self):
+        return self.df, "ok"
+
+# --- 總表沒變 (來源回傳同一個物件)：重跑拿到同一個整理好的目錄；總表換了才重新整理 ---
+def test_prepared_catalog_follows_snapshot(tmp_path):
+    origin = FakeOrigin(catalog_frame("講座 A"))
+    refresher = CatalogRefresher(origin, snapshot_dir=str(tmp_path))
+    refresher.start = lambda: None # 不開背景執行緒
+
+    first, msg = refresher.get_prepared()
+    assert msg == "ok" and list(first.df["活動名稱"]) == ["講座 A"]
+    refresher.refresh()
+    assert refresher.get_prepared()[0] is first
+
+    origin.df = catalog_frame("講座 B")
+    refresher.refresh()
+    second, _ = refresher.get_prepared()
+    assert second is not first and list(second.df["活動名稱"]) == ["講座 B"]
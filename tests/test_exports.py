@@ -0,0 +1,60 @@
+import pandas as pd
+
+from exports import build_ics, event_uid, iter_ics
+
+def selection(*events):
+    rows = [{"id": eid, "日期": start[:10], "時間": f"{start[11:]}-{end[11:]}", "活動名稱": title, "地點": place,
+             "start_dt": pd.Timestamp(start), "end_dt": pd.Timestamp(end)}
+            for eid, start, end, title, place in events]
+    return pd.DataFrame(rows)
+
+def unfold(ics):
+    return ics.replace("\r\n ", "")
+
+def props(ics, name):
+    return [line.split(":", 1)[1] for line in unfold(ics).split("\r\n") if line.startswith(name + ":")]
+
+# --- 台北時間 -> UTC：減 8 小時，早上的場次會跨到前一天 ---
+def test_times_are_converted_from_taipei_to_utc():
+    ics = build_ics(selection(
+        ("a", "2026-02-03 10:00", "2026-02-03 11:30", "講座", "紅沙龍"),
+        ("b", "2026-02-04 07:30", "2026-02-04 08:00", "早鳥導覽", "一館大廳"),
+    ))
+    assert props(ics, "DTSTART") == ["20260203T020000Z", "20260203T233000Z"]
+    assert props(ics, "DTEND") == ["20260203T033000Z", "20260204T000000Z"]
+    assert "X-WR-TIMEZONE:Asia/Taipei" in ics
+
+# --- 沒有時間資料的場次不輸出 ---
+def test_rows_without_times_are_skipped():
+    df = selection(("a", "2026-02-03 10:00", "2026-02-03 11:00", "講座", "紅沙龍"),
+                   ("b", "2026-02-03 13:00", "2026-02-03 14:00", "時間未定", "B412"))
+    df.loc[1, ["start_dt", "end_dt"]] = pd.NaT
+    assert unfold(build_ics(df)).count("BEGIN:VEVENT") == 1
+
+# --- UID 只看活動 id：重新匯出、換順序、從訂閱產生都一樣 ---
+def test_uid_is_stable_per_event_id():
+    a = ("a1b2c3", "2026-02-03 10:00", "2026-02-03 11:00", "講座", "紅沙龍")
+    b = ("d4e5f6", "2026-02-03 13:00", "2026-02-03 14:00", "簽書會", "B412")
+    first = props(build_ics(selection(a, b)), "UID")
+    again = props("".join(iter_ics(selection(b, a))), "UID")
+    assert first == [event_uid("a1b2c3"), event_uid("d4e5f6")]
+    assert again == first[::-1]
+    assert first[0] != first[1]
+
+# --- RFC 5545 跳脫：反斜線、分號、逗號、換行 ---
+def test_text_is_escaped():
+    ics = build_ics(selection(("a", "2026-02-03 10:00", "2026-02-03 11:00", "書展;講座,第一場\n下半場\\續", "A區,紅沙龍")))
+    assert props(ics, "SUMMARY") == [r"書展\;講座\,第一場\n下半場\\續 (A區\,紅沙龍)"]
+    assert props(ics, "LOCATION") == [r"A區\,紅沙龍"]
+    assert "\n下半場" not in ics
+
+# --- 折行：每一行最多 75 bytes，不切在中文字中間，展開後跟原文一樣 ---
+def test_long_lines_fold_on_character_boundaries():
+    title = "2026 台北國際書展大獎頒獎典禮暨年度選書座談：與作家們聊聊這一年的閱讀與出版趨勢 (下午場)"
+    ics = build_ics(selection(("a", "2026-02-03 10:00", "2026-02-03 11:00", title, "紅沙龍")))
+    raw_lines = ics.encode("utf-8").split(b"\r\n")
+    assert max(len(line) for line in raw_lines) <= 75
+    for line in raw_lines:
+        line.decode("utf-8") # 切在多位元組字元中間會在這裡出錯
+    assert any(line.startswith(b" ") for line in raw_lines)
+    assert props(ics, "SUMMARY") == [f"{title} (紅沙龍)"]
@@ -0,0 +1,112 @@
+import http.client
+import threading
+
+import pytest
+
+import feed_server
+import user_store
+from feed_server import (USER_COLS, CsvScheduleSource, SheetScheduleSource, StoreScheduleSource,
+                         feed_path, make_server)
+from user_store import SqliteUserStore
+
+SECRET = "test-secret"
+
+def serve(source):
+    srv = make_server(source, SECRET, host="127.0.0.1", port=0)
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    return srv
+
+@pytest.fixture
+def server(tmp_path):
+    path = tmp_path / "users.csv"
+    path.write_text(
+        ",".join(USER_COLS) + "\n"
+        + "alice,1111,ev1,2026-02-03,10:00~11:00,書展大獎 頒獎典禮,紅沙龍\n"
+        + "alice,1111,ev2,2026-02-04,13:30~14:30,新書簽書會,B412\n"
+        + "bob,2222,ev3,2026-02-03,15:00~16:00,繪本工作坊,兒童館\n",
+        encoding="utf-8-sig",
+    )
+    srv = serve(CsvScheduleSource(str(path)))
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+def connect(srv):
+    return http.client.HTTPConnection("127.0.0.1", srv.server_address[1], timeout=5)
+
+def test_get_returns_users_schedule(server):
+    conn = connect(server)
+    conn.request("GET", feed_path(SECRET, "alice"))
+    resp = conn.getresponse()
+    body = resp.read().decode("utf-8")
+    assert resp.status == 200 and resp.getheader("Transfer-Encoding") == "chunked"
+    assert body.count("BEGIN:VEVENT") == 2 and "繪本工作坊" not in body
+
+# --- HEAD 之後同一條 keep-alive 連線還要能正常送下一個請求 ---
+def test_head_then_get_on_same_connection(server):
+    conn = connect(server)
+    conn.request("HEAD", feed_path(SECRET, "alice"))
+    head = conn.getresponse()
+    head.read()
+    assert head.status == 200 and head.getheader("Transfer-Encoding") is None
+
+    conn.request("GET", feed_path(SECRET, "alice"))
+    resp = conn.getresponse()
+    body = resp.read()
+    assert resp.status == 200
+    assert int(head.getheader("Content-Length")) == len(body)
+    assert head.getheader("ETag") == resp.getheader("ETag")
+
+def test_if_none_match_returns_304(server):
+    conn = connect(server)
+    conn.request("GET", feed_path(SECRET, "bob"))
+    first = conn.getresponse()
+    first.read()
+    conn.request("GET", feed_path(SECRET, "bob"), headers={"If-None-Match": first.getheader("ETag")})
+    resp = conn.getresponse()
+    assert resp.status == 304 and resp.read() == b""
+
+# --- 還沒選任何場次的使用者：回一份空的行事曆，不是錯誤 ---
+def test_user_without_events_gets_empty_calendar(server):
+    conn = connect(server)
+    conn.request("GET", feed_path(SECRET, "carol"))
+    resp = conn.getresponse()
+    body = resp.read().decode("utf-8")
+    assert resp.status == 200 and "BEGIN:VCALENDAR" in body and "BEGIN:VEVENT" not in body
+
+def test_wrong_token_is_404(server):
+    conn = connect(server)
+    conn.request("GET", feed_path("other-secret", "alice"))
+    resp = conn.getresponse()
+    resp.read()
+    assert resp.status == 404
+
+# --- [user_store] 是 sqlite：訂閱直接讀 SQLite，頁面一存檔就看得到 ---
+def test_feed_reads_sqlite_store(tmp_path):
+    store = SqliteUserStore(str(tmp_path / "users.sqlite3"))
+    srv = serve(StoreScheduleSource(store))
+    try:
+        conn = connect(srv)
+        conn.request("GET", feed_path(SECRET, "alice"))
+        resp = conn.getresponse()
+        assert resp.status == 200 and "BEGIN:VEVENT" not in resp.read().decode("utf-8")
+
+        store.save_schedule("alice", "1111", [["alice", "1111", "ev1", "2026-02-03", "10:00~11:00", "書展大獎 頒獎典禮", "紅沙龍"]])
+        conn.request("GET", feed_path(SECRET, "alice"))
+        body = conn.getresponse().read().decode("utf-8")
+        assert body.count("BEGIN:VEVENT") == 1 and "紅沙龍" in body
+    finally:
+        srv.shutdown()
+        srv.server_close()
+        store.close()
+
+def test_default_source_follows_store_backend(tmp_path, monkeypatch):
+    monkeypatch.setattr(user_store, "_stores", {})
+    monkeypatch.setattr(user_store, "load_store_settings", lambda: {})
+    assert isinstance(feed_server.default_schedule_source(), SheetScheduleSource)
+
+    path = str(tmp_path / "users.sqlite3")
+    monkeypatch.setattr(user_store, "load_store_settings", lambda: {"backend": "sqlite", "path": path})
+    source = feed_server.default_schedule_source()
+    assert isinstance(source, StoreScheduleSource) and source.store.path == path
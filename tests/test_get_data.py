@@ -0,0 +1,264 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+import get_data
+import gsheet_client
+from catalog import STANDARD_COLS
+from fake_gsheet import FakeWorksheet
+from get_data import FetchError, HostRateLimiter, PageCache
+
+URL = "https://www.tibe.org.tw/tw/calendar/69?page=1"
+
+class StubResponse:
+    def __init__(self, status_code, text="", headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+
+class StubSession:
+    """依序回傳預先排好的回應，並記下每次送出的 headers"""
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.sent = []
+
+    def get(self, url, timeout=None, headers=None):
+        self.sent.append(dict(headers or {}))
+        return self.responses.pop(0)
+
+@pytest.fixture(autouse=True)
+def no_rate_limit(monkeypatch):
+    monkeypatch.setattr(get_data, "rate_limiter", HostRateLimiter(10 ** 6))
+
+# ==========================================
+# 🗂️ PageCache：條件式請求
+# ==========================================
+def test_first_fetch_stores_validators(tmp_path):
+    cache = PageCache(str(tmp_path))
+    session = StubSession(StubResponse(200, "<html>v1</html>", {"ETag": '"v1"', "Last-Modified": "Mon, 02 Feb 2026 00:00:00 GMT"}))
+
+    html, events = cache.fetch(session, URL)
+
+    assert (html, events) == ("<html>v1</html>", None)
+    assert session.sent == [{}]
+    entry = cache.load(URL)
+    assert entry["etag"] == '"v1"' and entry["last_modified"] == "Mon, 02 Feb 2026 00:00:00 GMT"
+    assert cache.stats == {"hit": 0, "miss": 1}
+
+def test_304_reuses_cached_body_and_events(tmp_path):
+    cache = PageCache(str(tmp_path))
+    cache.fetch(StubSession(StubResponse(200, "<html>v1</html>", {"ETag": '"v1"', "Last-Modified": "LM1"})), URL)
+    cache.store_events(URL, [{"活動名稱": "講座"}])
+
+    session = StubSession(StubResponse(304))
+    html, events = cache.fetch(session, URL)
+
+    assert session.sent == [{"If-None-Match": '"v1"', "If-Modified-Since": "LM1"}]
+    assert (html, events) == ("<html>v1</html>", [{"活動名稱": "講座"}])
+    assert cache.load(URL)["etag"] == '"v1"'
+    assert cache.stats["hit"] == 1
+
+def test_200_with_new_content_rewrites_cache(tmp_path):
+    cache = PageCache(str(tmp_path))
+    cache.fetch(StubSession(StubResponse(200, "<html>v1</html>", {"ETag": '"v1"'})), URL)
+    cache.store_events(URL, [{"活動名稱": "舊"}])
+
+    html, events = cache.fetch(StubSession(StubResponse(200, "<html>v2</html>", {"ETag": '"v2"'})), URL)
+
+    assert (html, events) == ("<html>v2</html>", None) # 內容變了：要重新解析
+    entry = cache.load(URL)
+    assert entry["etag"] == '"v2"' and entry["html"] == "<html>v2</html>" and entry["events"] is None
+
+def test_200_with_same_content_keeps_parsed_events(tmp_path):
+    cache = PageCache(str(tmp_path))
+    cache.fetch(StubSession(StubResponse(200, "<html>v1</html>", {"ETag": '"a"'})), URL)
+    cache.store_events(URL, [{"活動名稱": "講座"}])
+
+    # 伺服器換了 ETag 但內容一樣：沿用解析結果，快取改存新的 ETag
+    html, events = cache.fetch(StubSession(StubResponse(200, "<html>v1</html>", {"ETag": '"b"'})), URL)
+
+    assert events == [{"活動名稱": "講座"}]
+    assert cache.load(URL)["etag"] == '"b"'
+
+def test_error_status_raises_and_keeps_cache(tmp_path):
+    cache = PageCache(str(tmp_path))
+    cache.fetch(StubSession(StubResponse(200, "<html>v1</html>", {"ETag": '"v1"'})), URL)
+
+    with pytest.raises(FetchError):
+        cache.fetch(StubSession(StubResponse(500)), URL)
+    assert cache.load(URL)["html"] == "<html>v1</html>"
+
+def test_404_means_no_such_page(tmp_path):
+    assert PageCache(str(tmp_path)).fetch(StubSession(StubResponse(404)), URL) == (None, None)
+
+def test_offline_replays_without_network(tmp_path):
+    PageCache(str(tmp_path)).fetch(StubSession(StubResponse(200, "<html>v1</html>")), URL)
+    session = StubSession()
+
+    assert PageCache(str(tmp_path), offline=True).fetch(session, URL) == ("<html>v1</html>", None)
+    assert session.sent == []
+
+# ==========================================
+# ⏱️ HostRateLimiter：同一個網站的請求間隔 (用假的時鐘，不真的睡)
+# ==========================================
+@pytest.fixture
+def clock(monkeypatch):
+    state = {"now": 100.0, "slept": []}
+    def sleep(seconds):
+        state["slept"].append(round(seconds, 6))
+        state["now"] += seconds
+    monkeypatch.setattr(time, "monotonic", lambda: state["now"])
+    monkeypatch.setattr(time, "sleep", sleep)
+    return state
+
+def test_rate_limiter_spaces_same_host(clock):
+    limiter = HostRateLimiter(4) # 每 0.25 秒一個
+    for _ in range(3):
+        limiter.wait("https://www.tibe.org.tw/a")
+    assert clock["slept"] == [0.25, 0.25]
+
+def test_rate_limiter_hosts_are_independent(clock):
+    limiter = HostRateLimiter(4)
+    limiter.wait("https://www.tibe.org.tw/a")
+    limiter.wait("https://example.com/b")
+    assert clock["slept"] == []
+
+def test_rate_limiter_no_wait_after_idle(clock):
+    limiter = HostRateLimiter(4)
+    limiter.wait("https://www.tibe.org.tw/a")
+    clock["now"] += 1.0
+    limiter.wait("https://www.tibe.org.tw/a")
+    assert clock["slept"] == []
+
+# ==========================================
+# 📅 某一天沒抓完整：回報失敗，不當成「沒有活動」
+# ==========================================
+class ScriptedCache:
+    def __init__(self, pages):
+        self.pages = pages # 頁碼 -> (html, events) 或 Exception
+
+    def fetch(self, session, url):
+        result = self.pages.get(int(url.rsplit("=", 1)[1]), ("", []))
+        if isinstance(result, Exception): raise result
+        return result
+
+    def store_events(self, url, events):
+        pass
+
+def run_scrape_date(cache):
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        return get_data.scrape_date(pool, None, cache, "2026-02-03 (二)", "69")
+
+def test_scrape_date_reports_failed_fetch():
+    events, complete = run_scrape_date(ScriptedCache({
+        1: ("<html/>", [{"活動名稱": "第一頁的活動"}]),
+        2: FetchError("HTTP 503"),
+    }))
+    assert not complete
+    assert [e["活動名稱"] for e in events] == ["第一頁的活動"]
+
+def test_scrape_date_complete_when_pages_run_out():
+    events, complete = run_scrape_date(ScriptedCache({
+        1: ("<html/>", [{"活動名稱": "A"}]),
+        2: (None, None), # 404：沒有第 2 頁
+    }))
+    assert complete and [e["日期"] for e in events] == ["2026-02-03"]
+
+# ==========================================
+# ☁️ 同步主表：只刪上一次爬到的活動、沒抓完整的日期不刪、只更新爬蟲有抓的欄位
+# ==========================================
+def event(date, title, note=""):
+    rec = dict.fromkeys(STANDARD_COLS, "")
+    rec.update({"日期": date, "時間": "10:00-11:00", "活動名稱": title, "地點": "紅沙龍", "備註": note})
+    return rec
+
+def sheet_row(rec, source="國際書展", fix=""):
+    return [rec[c] for c in STANDARD_COLS] + [source, fix]
+
+@pytest.fixture
+def master(monkeypatch):
+    header = STANDARD_COLS + ["來源", "人工修正"]
+    ws = FakeWorksheet([header,
+                        sheet_row(event("2026-02-03", "三號講座", "舊備註"), fix="改過場地"),
+                        sheet_row(event("2026-02-04", "四號講座")),
+                        sheet_row(event("2026-02-05", "五號講座"))], title="國際書展")
+    monkeypatch.setattr(gsheet_client, "get_worksheet", lambda *args, **kwargs: ws)
+    return ws
+
+PREV_SCRAPE = [event("2026-02-03", "三號講座", "舊備註"), event("2026-02-04", "四號講座"), event("2026-02-05", "五號講座")]
+
+def test_sync_skips_deletions_for_failed_dates(master):
+    # 2/4 沒抓完整 (沒有資料)，2/5 真的沒有活動了
+    df = pd.DataFrame([event("2026-02-03", "三號講座", "舊備註")])
+
+    result = get_data.sync_master_sheet(df, skip_dates=["2026-02-04"], prev_df=pd.DataFrame(PREV_SCRAPE))
+
+    assert result["removed"] == 1
+    assert [r[2] for r in master.rows[1:]] == ["三號講座", "四號講座"]
+
+def test_sync_update_keeps_unscraped_columns(master):
+    df = pd.DataFrame([event("2026-02-03", "三號講座", "新備註"),
+                       event("2026-02-04", "四號講座"),
+                       event("2026-02-05", "五號講座"),
+                       event("2026-02-06", "六號講座")])
+
+    result = get_data.sync_master_sheet(df, prev_df=pd.DataFrame(PREV_SCRAPE))
+
+    assert (result["changed"], result["inserted"]) == (1, 1)
+    assert master.rows[1] == sheet_row(event("2026-02-03", "三號講座", "新備註"), fix="改過場地")
+    assert master.rows[4] == ["2026-02-06", "10:00-11:00", "六號講座", "紅沙龍"] # 空白欄位在表尾會被去掉
+
+# --- 手動加的活動、手動改過時間的活動 (Key 變了) 都不刪，也不把爬到的原版再加一份 ---
+def test_sync_leaves_hand_maintained_rows(master):
+    hand_added = sheet_row(event("2026-02-07", "臨時加場"), source="手動")
+    moved = dict(event("2026-02-04", "四號講座"), 時間="15:00-16:00")
+    master.rows.append(hand_added)
+    master.rows[2] = sheet_row(moved, fix="改到下午")
+
+    df = pd.DataFrame(PREV_SCRAPE)
+    result = get_data.sync_master_sheet(df, prev_df=pd.DataFrame(PREV_SCRAPE))
+
+    assert result == {"inserted": 0, "changed": 0, "removed": 0}
+    assert master.rows[2] == sheet_row(moved, fix="改到下午")
+    assert master.rows[4] == hand_added
+
+# --- 沒有上一版 CSV：不知道哪些是爬來的，一律不刪 ---
+def test_sync_without_previous_scrape_deletes_nothing(master):
+    result = get_data.sync_master_sheet(pd.DataFrame([event("2026-02-03", "三號講座", "舊備註")]))
+    assert result["removed"] == 0 and len(master.rows) == 4
+
+# ==========================================
+# 🧩 解析：lxml + SoupStrainer 要跟原本的 html.parser 完整解析結果一樣
+# ==========================================
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+def fixture_html(name="calendar_page.html"):
+    with open(os.path.join(FIXTURES, name), "r", encoding="utf-8") as f:
+        return f.read()
+
+def test_fast_parse_matches_full_parse():
+    html = fixture_html()
+    fast, full = get_data.parse_page(html, fast=True), get_data.parse_page(html, fast=False)
+    assert fast == full
+    assert [e["活動名稱"] for e in fast] == [
+        "2026 書展大獎 頒獎典禮", "《海風的聲音》新書簽書會", "親子繪本 DIY 工作坊", "出版趨勢論壇 直播",
+    ]
+
+def test_multi_class_items_are_kept():
+    # class="calendar-item is-featured" / "card calendar-item" 都要抓到，"calendar-item-wrapper" 不算
+    events = get_data.parse_page(fixture_html(), fast=True)
+    signing = next(e for e in events if "簽書會" in e["活動名稱"])
+    assert (signing["時間"], signing["地點"], signing["類型"]) == ("13:30~14:30", "B412 攤位", "簽書會")
+    assert not any("外框" in e["活動名稱"] for e in events)
+
+@pytest.mark.parametrize("parser", ["lxml", "html.parser"])
+def test_strainer_with_each_parser(monkeypatch, parser):
+    monkeypatch.setattr(get_data, "FAST_PARSER", parser)
+    html = fixture_html()
+    assert get_data.parse_page(html, fast=True) == get_data.parse_page(html, fast=False)
+
+def test_bench_reads_html_fixtures():
+    assert get_data.load_bench_pages(FIXTURES) == [fixture_html()]
@@ -0,0 +1,49 @@
+import itertools
+import random
+
+import pandas as pd
+
+from planner import find_conflicts, plan_itinerary, suggest_non_conflicting
+
+def schedule(*events):
+    rows = [{"id": eid, "start_dt": pd.Timestamp(f"2026-02-03 {start}"), "end_dt": pd.Timestamp(f"2026-02-03 {end}"), "地點": loc}
+            for eid, start, end, loc in events]
+    return pd.DataFrame(rows)
+
+# --- 算進步行時間後，「最早結束先挑」會少排：x 先結束，但走去 D 區趕不上 z ---
+def test_suggest_keeps_most_events_with_travel():
+    df = schedule(
+        ("x", "10:00", "10:30", "A101"),
+        ("y", "10:00", "10:32", "D101"),
+        ("z", "10:40", "11:00", "D102"),
+        ("w", "11:05", "11:30", "D103"),
+    )
+    keep = suggest_non_conflicting(df)
+    assert keep == ["y", "z", "w"]
+    assert find_conflicts(df[df["id"].isin(keep)]) == []
+
+def test_suggest_matches_brute_force():
+    rng = random.Random(7)
+    venues = ["A101", "A205", "B310", "C120", "D401", "紅沙龍", "藍沙龍", "主舞台"]
+    for _ in range(200):
+        events = []
+        for k in range(8):
+            start = rng.randrange(9 * 60, 17 * 60, 5)
+            end = start + rng.choice([15, 30, 45, 60])
+            events.append((f"e{k}", f"{start // 60}:{start % 60:02d}", f"{end // 60}:{end % 60:02d}", rng.choice(venues)))
+        df = schedule(*events)
+
+        clashes = [set(pair) for pair in find_conflicts(df)]
+        best = max(
+            len(combo) for r in range(len(df) + 1)
+            for combo in itertools.combinations(df["id"], r)
+            if not any(pair <= set(combo) for pair in clashes)
+        )
+        keep = suggest_non_conflicting(df)
+        assert len(keep) == best
+        assert find_conflicts(df[df["id"].isin(keep)]) == []
+
+def test_plan_itinerary_prefers_weight():
+    df = schedule(("a", "10:00", "11:00", "A101"), ("b", "10:30", "11:30", "A101"), ("c", "11:00", "12:00", "A101"))
+    ids, score = plan_itinerary(df, [1, 5, 1])
+    assert ids == ["b"] and score == 5
@@ -0,0 +1,33 @@
+from fake_gsheet import FakeWorksheet
+import user_directory
+from user_directory import UserDirectory, check_pin
+
+HEADERS = ["User_ID", "Password", "ID", "日期", "時間", "活動名稱", "地點"]
+
+def make_directory(monkeypatch, ws):
+    monkeypatch.setattr(user_directory, "get_worksheet", lambda *args, **kwargs: ws)
+    return UserDirectory("sheet", "users", headers=HEADERS)
+
+def test_register_appends_after_last_row_not_into_gap(monkeypatch):
+    ws = FakeWorksheet([HEADERS, ["alice", "1111", "e1"], [], ["bob", "2222", "e2"]])
+    directory = make_directory(monkeypatch, ws)
+    assert directory.lookup("carol") is None
+
+    account = directory.register("carol", "3333", ["carol", "3333"] + [""] * 5)
+
+    assert ws.rows[2] == [] and ws.rows[3][0] == "bob"
+    assert ws.rows[4][:2] == ["carol", "3333"]
+    assert directory._scanned == 5 # 下次增量更新從新帳號之後讀
+    assert directory.lookup("carol") is account
+
+# --- 索引還沒看到別人剛註冊的同名帳號：不再寫一列，回傳現有帳號讓呼叫端比對密碼 ---
+def test_register_rechecks_before_writing(monkeypatch):
+    ws = FakeWorksheet([HEADERS, ["alice", "1111"]])
+    directory = make_directory(monkeypatch, ws)
+    assert directory.lookup("carol") is None
+    ws.rows.append(["carol", "9999"]) # 另一個 process 搶先註冊
+
+    account = directory.register("carol", "3333", ["carol", "3333"] + [""] * 5)
+
+    assert len(ws.rows_of("carol")) == 1
+    assert check_pin(account, "9999") and not check_pin(account, "3333")
@@ -0,0 +1,189 @@
+import pytest
+
+import user_store
+from fake_gsheet import FakeWorksheet
+from user_store import CART_COLS, SCHEDULE_COLS, MirroredUserStore, SheetsUserStore, SqliteUserStore
+
+def schedule_row(user_id, event_id):
+    return [user_id, "1111", event_id, "2026-02-03", "10:00-11:00", f"活動 {event_id}", "紅沙龍"]
+
+@pytest.fixture
+def sheets(monkeypatch):
+    tabs = {}
+    monkeypatch.setattr(user_store, "get_worksheet", lambda sheet_name, tab_name: tabs[sheet_name])
+    return tabs
+
+# --- 行事曆：A 縮小後留下空白列，B 再新增場次也不能蓋到 C 的列 ---
+def test_schedule_shrink_then_grow_keeps_other_users(sheets):
+    ws = FakeWorksheet([SCHEDULE_COLS]
+                       + [schedule_row("alice", f"a{i}") for i in range(3)]
+                       + [schedule_row("bob", "b0")]
+                       + [schedule_row("carol", f"c{i}") for i in range(2)])
+    sheets[user_store.SHEET_NAME_CALENDAR] = ws
+    store = SheetsUserStore()
+    carol_before = ws.rows_of("carol")
+
+    store.save_schedule("alice", "1111", [schedule_row("alice", "a0")])
+    assert ws.rows[2] == [] and ws.rows[3] == [] # 清空後留在表中間的空白列
+
+    store.save_schedule("bob", "1111", [schedule_row("bob", f"b{i}") for i in range(4)])
+
+    assert ws.rows_of("carol") == carol_before
+    assert [r[2] for _, r in ws.rows_of("alice")] == ["a0"]
+    assert sorted(store.load_schedule_ids("bob")) == ["b0", "b1", "b2", "b3"]
+
+def cart_row(user_id, key, title):
+    return [user_id, "1111", title, "出版社", "400", "79", "316", "待購", "", key]
+
+# --- 買書：A 刪掉幾本後，B 追加新書不能蓋到 B 自己或 C 原本的列 ---
+def test_cart_shrink_then_append_keeps_other_users(sheets):
+    ws = FakeWorksheet([CART_COLS]
+                       + [cart_row("alice", f"ka{i}", f"A 書 {i}") for i in range(4)]
+                       + [cart_row("bob", "kb0", "B 書 0")]
+                       + [cart_row("carol", f"kc{i}", f"C 書 {i}") for i in range(2)])
+    sheets[user_store.SHEET_NAME_CART] = ws
+    store = SheetsUserStore()
+    before = {uid: ws.rows_of(uid) for uid in ("bob", "carol")}
+
+    store.save_cart("alice", "1111", [cart_row("alice", "ka0", "A 書 0")])
+    assert [r for r in ws.rows[2:5]] == [[], [], []]
+
+    store.append_cart("bob", "1111", [cart_row("bob", f"kb{i}", f"B 書 {i}") for i in range(1, 5)])
+
+    assert ws.rows_of("carol") == before["carol"]
+    assert ws.rows_of("bob")[:1] == before["bob"]
+    assert list(store.load_cart("bob")["Key"]) == ["kb0", "kb1", "kb2", "kb3", "kb4"]
+    assert list(store.load_cart("alice")["Key"]) == ["ka0"]
+
+# --- 書單變大時，多出來的列也接在表尾 ---
+def test_cart_save_growth_appends_at_end(sheets):
+    ws = FakeWorksheet([CART_COLS]
+                       + [cart_row("alice", f"ka{i}", f"A 書 {i}") for i in range(3)]
+                       + [cart_row("carol", "kc0", "C 書 0")])
+    sheets[user_store.SHEET_NAME_CART] = ws
+    store = SheetsUserStore()
+    store.save_cart("alice", "1111", [cart_row("alice", "ka0", "A 書 0")])
+    store.save_cart("alice", "1111", [cart_row("alice", f"ka{i}", f"A 書 {i}") for i in range(6)])
+
+    assert ws.rows_of("carol") == [(5, cart_row("carol", "kc0", "C 書 0"))]
+    assert sorted(store.load_cart("alice")["Key"]) == [f"ka{i}" for i in range(6)]
+
+# ==========================================
+# SQLite / 同步備份 (全部用 tmp_path 的資料庫，不連網路)
+# ==========================================
+@pytest.fixture
+def db(tmp_path):
+    store = SqliteUserStore(str(tmp_path / "users.sqlite3"))
+    yield store
+    store.close()
+
+# --- 行事曆：儲存是整份取代，存空的就清光，不影響別人 ---
+def test_sqlite_schedule_replace_and_clear(db):
+    db.save_schedule("alice", "1111", [schedule_row("alice", e) for e in ("a0", "a1", "a2")])
+    db.save_schedule("bob", "2222", [schedule_row("bob", "b0")])
+
+    db.save_schedule("alice", "1111", [schedule_row("alice", e) for e in ("a1", "a3")])
+    assert sorted(db.load_schedule_ids("alice")) == ["a1", "a3"]
+
+    db.save_schedule("alice", "1111", [])
+    assert db.load_schedule_ids("alice") == []
+    assert db.load_schedule_ids("bob") == ["b0"]
+
+# --- 買書：追加的書排在既有的書後面，讀回來照加入順序 ---
+def test_sqlite_append_cart_keeps_order(db):
+    db.append_cart("alice", "1111", [cart_row("alice", "k2", "第一本"), cart_row("alice", "k1", "第二本")])
+    db.append_cart("alice", "1111", [cart_row("alice", "k0", "第三本")])
+    db.append_cart("bob", "2222", [cart_row("bob", "kb", "B 的書")])
+
+    cart = db.load_cart("alice")
+    assert list(cart.columns) == CART_COLS[2:]
+    assert list(cart["Key"]) == ["k2", "k1", "k0"]
+    assert list(cart["書名"]) == ["第一本", "第二本", "第三本"]
+
+# --- 買書：儲存整份取代 (改名、刪除、換順序)，佔位列不存 ---
+def test_sqlite_save_cart_replaces_rows(db):
+    db.append_cart("alice", "1111", [cart_row("alice", f"k{i}", f"書 {i}") for i in range(3)])
+    db.append_cart("bob", "2222", [cart_row("bob", "kb", "B 的書")])
+
+    db.save_cart("alice", "1111", [
+        cart_row("alice", "k2", "書 2"),
+        cart_row("alice", "k0", "書 0 (改)"),
+        ["alice", "1111"] + [""] * (len(CART_COLS) - 2),
+    ])
+    cart = db.load_cart("alice")
+    assert list(cart["Key"]) == ["k2", "k0"]
+    assert list(cart["書名"]) == ["書 2", "書 0 (改)"]
+    assert list(db.load_cart("bob")["Key"]) == ["kb"]
+
+    db.save_cart("alice", "1111", [])
+    assert db.load_cart("alice").empty
+
+class RecordingStore:
+    key = ("recording",)
+
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+
+    def __getattr__(self, method):
+        def record(*args):
+            self.calls.append((method, args))
+            if self.fail: raise ConnectionError("連線失敗")
+        return record
+
+# --- 同步備份：寫入都轉送到備份 (照順序)，讀取只走主要儲存；備份失敗不影響主要儲存 ---
+def test_mirror_forwards_writes(db):
+    backup = RecordingStore()
+    store = MirroredUserStore(db, backup)
+    store.save_schedule("alice", "1111", [schedule_row("alice", "a0")])
+    store.append_cart("alice", "1111", [cart_row("alice", "k0", "書 0")])
+    store.save_cart("alice", "1111", [cart_row("alice", "k1", "書 1")])
+    assert store.load_schedule_ids("alice") == ["a0"]
+    assert list(store.load_cart("alice")["Key"]) == ["k1"]
+    store._executor.shutdown(wait=True)
+
+    assert [method for method, _args in backup.calls] == ["save_schedule", "append_cart", "save_cart"]
+    assert backup.calls[0][1] == ("alice", "1111", [schedule_row("alice", "a0")])
+
+    failing = MirroredUserStore(db, RecordingStore(fail=True))
+    failing.save_schedule("bob", "2222", [schedule_row("bob", "b0")])
+    failing._executor.shutdown(wait=True)
+    assert db.load_schedule_ids("bob") == ["b0"]
+
+# --- 依設定建立儲存，同一組設定整個 process 共用同一個物件 ---
+def test_get_user_store_follows_settings(tmp_path, monkeypatch):
+    path = str(tmp_path / "users.sqlite3")
+    monkeypatch.setattr(user_store, "_stores", {})
+    monkeypatch.setattr(user_store, "load_store_settings", lambda: {"backend": "sqlite", "path": path})
+    store = user_store.get_user_store()
+    assert isinstance(store, SqliteUserStore) and store.path == path
+    assert user_store.get_user_store() is store
+
+    monkeypatch.setattr(user_store, "load_store_settings", lambda: {"backend": "sqlite", "path": path, "mirror": True})
+    mirrored = user_store.get_user_store()
+    assert isinstance(mirrored, MirroredUserStore) and isinstance(mirrored.mirror, SheetsUserStore)
+
+    # secrets.json 裡寫成字串也要照字面解讀
+    monkeypatch.setattr(user_store, "load_store_settings", lambda: {"backend": "sqlite", "path": path, "mirror": "false"})
+    assert user_store.get_user_store() is store
+    monkeypatch.setattr(user_store, "load_store_settings", lambda: {"backend": "sqlite", "path": path, "mirror": "True"})
+    assert user_store.get_user_store() is mirrored
+
+    with pytest.raises(ValueError):
+        user_store.make_store("postgres")
+
+# --- 從 Google Sheets 匯入：佔位列跳過，沒有 Key 的書補上 Key ---
+def test_import_from_sheets(sheets, db):
+    sheets[user_store.SHEET_NAME_CALENDAR] = FakeWorksheet([SCHEDULE_COLS]
+        + [schedule_row("alice", "a0"), ["bob", "2222"], schedule_row("alice", "a1"), schedule_row("bob", "b0")])
+    sheets[user_store.SHEET_NAME_CART] = FakeWorksheet([CART_COLS]
+        + [cart_row("alice", "k0", "書 0"), cart_row("alice", "", "舊資料沒有 Key"), ["bob", "2222"]])
+
+    user_store.import_from_sheets(db)
+
+    assert sorted(db.load_schedule_ids("alice")) == ["a0", "a1"]
+    assert db.load_schedule_ids("bob") == ["b0"]
+    cart = db.load_cart("alice")
+    assert list(cart["書名"]) == ["書 0", "舊資料沒有 Key"]
+    assert cart["Key"].iloc[0] == "k0" and len(cart["Key"].iloc[1]) == 12
+    assert db.load_cart("bob").empty
@@ -0,0 +1,112 @@
+import hashlib
+import hmac
+import re
+import threading
+import time
+
+from gsheet_client import append_rows_at_end, get_worksheet
+
+# ==========================================
+# 👥 帳號索引 (User_ID -> 密碼雜湊)
+# 登入時不用再下載整張 users 表：第一次只讀 A:B 兩欄建立索引，
+# 之後每隔 TAIL_TTL 秒只補讀新增在表尾的列，每隔 FULL_TTL 秒才整份重建一次
+# ==========================================
+TAIL_TTL = 30
+FULL_TTL = 600
+
+_lock = threading.Lock()
+_directories = {} # (試算表名稱, 分頁名稱) -> UserDirectory
+
+def hash_pin(pin):
+    return hashlib.sha256(str(pin).strip().encode("utf-8")).hexdigest()
+
+# --- 密碼比對 (索引裡只放雜湊，不放明碼) ---
+def check_pin(account, input_pin):
+    return hmac.compare_digest(account["pin_hash"], hash_pin(input_pin))
+
+class UserDirectory:
+    def __init__(self, sheet_name, tab_name, headers=None, rows=None, cols=None):
+        self.sheet_name = sheet_name
+        self.tab_name = tab_name
+        self.headers = headers # 空表時要寫入的標題列
+        self.rows = rows # 分頁不存在時自動建立的大小
+        self.cols = cols
+        self._lock = threading.RLock()
+        self._accounts = {}
+        self._scanned = 0 # 已經讀進索引的列數 (含標題列)
+        self._full_at = 0.0
+        self._tail_at = 0.0
+
+    def _worksheet(self):
+        return get_worksheet(self.sheet_name, self.tab_name, rows=self.rows, cols=self.cols)
+
+    def _index_rows(self, values, first_row_no):
+        for offset, row in enumerate(values):
+            row_no = first_row_no + offset
+            uid = str(row[0]).strip() if row else ""
+            if not uid or (row_no == 1 and uid == "User_ID"): continue
+            if uid not in self._accounts:
+                # 同一帳號以第一列的密碼為準 (與原本 iloc[0] 的判斷一致)
+                pin = str(row[1]).strip() if len(row) > 1 else ""
+                self._accounts[uid] = {"pin_hash": hash_pin(pin), "has_pin": pin != ""}
+
+    # --- 整份重建 (只讀 User_ID、Password 兩欄) ---
+    def _full_reload(self):
+        ws = self._worksheet()
+        values = ws.batch_get(["A:B"])[0]
+        if not values and self.headers:
+            ws.update(range_name='A1', values=[self.headers])
+            values = [self.headers[:2]]
+        self._accounts = {}
+        self._index_rows(values, 1)
+        self._scanned = len(values)
+        self._full_at = self._tail_at = time.time()
+
+    # --- 增量更新：只讀上次看到的最後一列之後的資料 ---
+    def _tail_reload(self):
+        start = self._scanned + 1
+        values = self._worksheet().batch_get([f"A{start}:B"])[0]
+        self._index_rows(values, start)
+        self._scanned += len(values)
+        self._tail_at = time.time()
+
+    def _ensure_fresh(self):
+        now = time.time()
+        if now - self._full_at > FULL_TTL:
+            self._full_reload()
+        elif now - self._tail_at > TAIL_TTL:
+            self._tail_reload()
+
+    def lookup(self, user_id):
+        with self._lock:
+            self._ensure_fresh()
+            return self._accounts.get(str(user_id).strip())
+
+    # --- 註冊：寫入前重讀一次 A:B，再接在最後一列後面寫入並更新索引 ---
+    # 索引可能還沒看到別的 process 剛註冊的同名帳號：已經有人註冊就不寫入，
+    # 回傳現有帳號，由呼叫端比對密碼 (避免同一個 ID 註冊兩次)
+    def register(self, user_id, input_pin, row):
+        user_id = str(user_id).strip()
+        with self._lock:
+            self._full_reload()
+            existing = self._accounts.get(user_id)
+            if existing is not None: return existing
+
+            resp = append_rows_at_end(self._worksheet(), [row], last_row=self._scanned)
+            account = {"pin_hash": hash_pin(input_pin), "has_pin": str(input_pin).strip() != ""}
+            self._accounts[user_id] = account
+            # 回傳格式：{"updates": {"updatedRange": "users!A12:G12"}}；下次增量更新從這列之後讀
+            m = re.search(r"![A-Z]+(\d+)", str((resp or {}).get("updates", {}).get("updatedRange", "")))
+            if m: self._scanned = max(self._scanned, int(m.group(1)))
+            return account
+
+# --- 取得共用索引 (行事曆、買書兩邊同一個 process 共用) ---
+def get_user_directory(sheet_name, tab_name, headers=None, rows=None, cols=None):
+    key = (sheet_name, tab_name)
+    with _lock:
+        if key not in _directories:
+            _directories[key] = UserDirectory(sheet_name, tab_name, headers=headers, rows=rows, cols=cols)
+        directory = _directories[key]
+        if headers and not directory.headers:
+            directory.headers, directory.rows, directory.cols = headers, rows, cols
+        return directory
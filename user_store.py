@@ -0,0 +1,453 @@
+import argparse
+import os
+import re
+import sqlite3
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from app_settings import load_settings
+from gsheet_client import append_rows_at_end, get_worksheet
+
+# ==========================================
+# 🗄️ 使用者資料儲存 (行事曆已選場次、買書書單)
+# 兩個頁面只呼叫這裡的介面，實際存在哪裡由 secrets 的 [user_store] 決定：
+#   backend = "sheets" (預設) -> Google Sheets 的 users 表 (原本的做法)
+#   backend = "sqlite"        -> 本機 SQLite 檔 (WAL 模式)，每位使用者的讀寫都是索引查詢
+#   mirror = true             -> sqlite 寫完後，背景再同步一份到 Google Sheets (匯出/備份用)
+# 帳號與登入仍然是 Google Sheets 的 users 表 (user_directory)，這裡只管資料本身
+#
+# 從 Google Sheets 匯入既有資料：python user_store.py --import-sheets
+# ==========================================
+SHEET_NAME_CALENDAR = "2026國際書展使用者行事曆"
+SHEET_NAME_CART = "2026國際書展使用者採購清單"
+WORKSHEET_USERS_TAB = "users"
+DEFAULT_DB_PATH = "user_data.sqlite3"
+
+SCHEDULE_COLS = ["User_ID", "Password", "ID", "日期", "時間", "活動名稱", "地點"]
+CART_COLS = ["User_ID", "Password", "書名", "出版社", "定價", "折扣", "折扣價", "狀態", "備註", "Key"]
+CART_VIEW_COLS = CART_COLS[2:] # 頁面上看到的書單欄位 (不含帳號密碼)
+
+_lock = threading.Lock()
+_stores = {} # 設定 -> 儲存物件 (整個 process 共用)
+
+# --- 每一列書的固定代號 ---
+def new_cart_key():
+    return uuid.uuid4().hex[:12]
+
+# --- 已選場次 DataFrame -> 雲端格式的 List (欄位順序同 SCHEDULE_COLS) ---
+def schedule_records(user_id, user_pin, selected_df):
+    col_mapping = {"id": "ID", "日期": "日期", "時間": "時間", "活動名稱": "活動名稱", "地點": "地點"}
+    src_df = selected_df.reindex(columns=list(col_mapping)).fillna("").astype(str)
+    records = {} # 同一場只留一列
+    for rec in src_df.itertuples(index=False):
+        records[rec[0]] = [str(user_id), str(user_pin)] + list(rec)
+    return list(records.values())
+
+# --- 把連續列號合併成 A1 範圍 (例如 5,6,7 -> A5:G7)，減少 API 請求數 ---
+def merge_row_ranges(row_numbers, first_col="A", last_col="G"):
+    ranges = []
+    for r in sorted(row_numbers):
+        if ranges and ranges[-1][1] == r - 1:
+            ranges[-1][1] = r
+        else:
+            ranges.append([r, r])
+    return [f"{first_col}{a}:{last_col}{b}" for a, b in ranges]
+
+# ==========================================
+# ☁️ Google Sheets：原本的差異寫入邏輯 (只動自己的列，保留帳號佔位列)
+# ==========================================
+class SheetsUserStore:
+    def __init__(self, calendar_sheet=SHEET_NAME_CALENDAR, cart_sheet=SHEET_NAME_CART, tab_name=WORKSHEET_USERS_TAB):
+        self.calendar_sheet = calendar_sheet
+        self.cart_sheet = cart_sheet
+        self.tab_name = tab_name
+        self.key = ("sheets", calendar_sheet, cart_sheet, tab_name)
+
+    def _worksheet(self, sheet_name):
+        ws = get_worksheet(sheet_name, self.tab_name)
+        if ws is None: raise ConnectionError("連線失敗")
+        return ws
+
+    # --- 行事曆：讀取已選場次 (過濾空白幽靈 ID) ---
+    def load_schedule_ids(self, user_id):
+        data = self._worksheet(self.calendar_sheet).get_all_values()
+        if len(data) < 2: return []
+        df = pd.DataFrame(data[1:], columns=data[0])
+        if "User_ID" not in df.columns or "ID" not in df.columns: return []
+
+        user_data = df[df["User_ID"] == str(user_id)]
+        # 過濾掉 ID 是空字串的資料 (踢掉佔位用的空行)
+        clean_ids = user_data["ID"].fillna("").astype(str).str.strip()
+        return clean_ids[clean_ids != ""].tolist()
+
+    # --- 行事曆：儲存 (records 欄位同 SCHEDULE_COLS) ---
+    def save_schedule(self, user_id, user_pin, records):
+        ws = self._worksheet(self.calendar_sheet)
+        user_id = str(user_id)
+
+        # 1. 只下載 User_ID (A 欄) 與 ID (C 欄)，用來定位「自己的列」
+        col_uid, col_id = ws.batch_get(["A:A", "C:C"])
+        uids = [str(r[0]).strip() if r else "" for r in col_uid]
+        ids = [str(r[0]).strip() if r else "" for r in col_id]
+        if not uids:
+            ws.update(range_name='A1', values=[SCHEDULE_COLS])
+            uids = ["User_ID"]
+        first = 1 if uids[0] == "User_ID" else 0 # 有標題列就跳過
+
+        my_rows = {} # 列號 (從 1 起算) -> 活動 ID
+        for i in range(first, len(uids)):
+            if uids[i] == user_id:
+                my_rows[i + 1] = ids[i] if i < len(ids) else ""
+
+        # 2. 新資料 (活動 ID -> 整列內容)
+        new_records = {rec[2]: rec for rec in records}
+
+        # 3. 比對差異：已存在的保留不動，不要的列讓出來給新資料重用
+        kept_ids = set()
+        free_rows = []
+        has_placeholder = False
+        for row_no, eid in sorted(my_rows.items()):
+            if eid == "":
+                has_placeholder = True # 註冊時的佔位列，保留帳號用
+            elif eid in new_records and eid not in kept_ids:
+                kept_ids.add(eid)
+            else:
+                free_rows.append(row_no)
+        to_add = [rec for eid, rec in new_records.items() if eid not in kept_ids]
+
+        # 4. 批次寫入：先覆寫自己讓出來的列，不夠再追加，多的清空
+        #    (清空而不是刪列，列號不會位移，其他人同時儲存也不會互相蓋掉)
+        reuse = list(zip(free_rows, to_add))
+        rows_to_clear = free_rows[len(reuse):]
+        if rows_to_clear and not kept_ids and not to_add and not has_placeholder:
+            # 全部取消勾選：留一列佔位，不然帳號會一起消失
+            reuse.append((rows_to_clear.pop(0), [user_id, str(user_pin)] + [""] * (len(SCHEDULE_COLS) - 2)))
+
+        if reuse:
+            ws.batch_update([{"range": f"A{row_no}:G{row_no}", "values": [rec]} for row_no, rec in reuse])
+        if len(to_add) > len(free_rows):
+            # 接在整張表真正的最後一列後面 (不會落進別人清空留下的空白列)
+            append_rows_at_end(ws, to_add[len(free_rows):], last_row=len(uids))
+        if rows_to_clear:
+            ws.batch_clear(merge_row_ranges(rows_to_clear))
+
+    # --- 買書：讀取書單 ---
+    def load_cart(self, user_id):
+        ws = self._worksheet(self.cart_sheet)
+        data = ws.get_all_values()
+        if len(data) < 2: return pd.DataFrame() # 只有標題或空的
+
+        # 舊表沒有 Key 欄：補上標題，之後的差異寫入才對得上
+        if "User_ID" in data[0] and "Key" not in data[0]:
+            ws.update(range_name='A1', values=[CART_COLS])
+            data = [CART_COLS] + [row + [""] * (len(CART_COLS) - len(row)) for row in data[1:]]
+
+        df = pd.DataFrame(data[1:], columns=data[0])
+        if "User_ID" not in df.columns: return pd.DataFrame()
+
+        user_df = df[df["User_ID"] == str(user_id)].copy()
+        for c in CART_VIEW_COLS:
+            if c not in user_df.columns: user_df[c] = ""
+
+        # 過濾掉「書名」為空的資料 (註冊時的佔位列)
+        user_df = user_df[user_df["書名"].astype(str).str.strip() != ""]
+
+        # 舊資料沒有 Key：先在記憶體補上，下次儲存時會整列換成有 Key 的版本
+        no_key = user_df["Key"].astype(str).str.strip() == ""
+        user_df.loc[no_key, "Key"] = [new_cart_key() for _ in range(int(no_key.sum()))]
+        return user_df[CART_VIEW_COLS]
+
+    # --- 買書：只追加新的列，不動其他資料 ---
+    def append_cart(self, user_id, user_pin, records):
+        append_rows_at_end(self._worksheet(self.cart_sheet), records)
+
+    # --- 買書：儲存 (差異寫入版：依 Key 只改動有變的列；records 欄位同 CART_COLS) ---
+    def save_cart(self, user_id, user_pin, records):
+        ws = self._worksheet(self.cart_sheet)
+        user_id = str(user_id)
+
+        # 1. 只下載標題列、User_ID (A 欄) 與 Key (J 欄)，定位自己的列
+        header, col_uid, col_key = ws.batch_get(["1:1", "A:A", "J:J"])
+        header = header[0] if header else []
+        if "User_ID" not in header or "Key" not in header:
+            # 空表或舊表：寫入 (或補齊) 標題列
+            ws.update(range_name='A1', values=[CART_COLS])
+        uids = [str(r[0]).strip() if r else "" for r in col_uid]
+        keys = [str(r[0]).strip() if r else "" for r in col_key]
+        first = 1 if uids and uids[0] == "User_ID" else 0
+
+        my_rows = [i + 1 for i in range(first, len(uids)) if uids[i] == user_id]
+
+        # 2. 只讀回「自己的列」目前的內容，用來判斷哪些列真的有改
+        old_values = {}
+        if my_rows:
+            ranges = merge_row_ranges(my_rows, last_col="J")
+            for rng, values in zip(ranges, ws.batch_get(ranges)):
+                start = int(re.match(r"A(\d+)", rng).group(1))
+                for offset, row in enumerate(values):
+                    old_values[start + offset] = [str(v) for v in row] + [""] * (len(CART_COLS) - len(row))
+
+        # 3. 新資料 (Key -> 整列內容)
+        new_records = {rec[-1]: rec for rec in records}
+
+        # 4. 比對差異：沒變的不動、有變的原地覆寫、不要的列讓出來給新資料重用
+        updates = []
+        seen_keys = set()
+        free_rows = []
+        has_placeholder = False
+        for row_no in my_rows:
+            key = keys[row_no - 1] if row_no - 1 < len(keys) else ""
+            old = old_values.get(row_no, [""] * len(CART_COLS))
+            if key in new_records and key not in seen_keys:
+                seen_keys.add(key)
+                if old != [str(v) for v in new_records[key]]:
+                    updates.append((row_no, new_records[key]))
+            elif key == "" and old[2].strip() == "":
+                has_placeholder = True # 註冊時的佔位列，保留帳號用
+            else:
+                free_rows.append(row_no)
+        to_add = [rec for key, rec in new_records.items() if key not in seen_keys]
+
+        # 5. 批次寫入 (清空而不是刪列，列號不會位移，其他人同時儲存也不會互相蓋掉)
+        updates += list(zip(free_rows, to_add))
+        rows_to_clear = free_rows[len(to_add):]
+        if rows_to_clear and not new_records and not has_placeholder:
+            # 書單全刪光：留一列佔位，不然帳號會一起消失
+            updates.append((rows_to_clear.pop(0), [user_id, str(user_pin)] + [""] * (len(CART_COLS) - 2)))
+
+        if updates:
+            ws.batch_update([{"range": f"A{row_no}:J{row_no}", "values": [rec]} for row_no, rec in updates])
+        if len(to_add) > len(free_rows):
+            # 接在整張表真正的最後一列後面 (不會落進別人清空留下的空白列)
+            append_rows_at_end(ws, to_add[len(free_rows):], last_row=len(uids))
+        if rows_to_clear:
+            ws.batch_clear(merge_row_ranges(rows_to_clear, last_col="J"))
+
+# ==========================================
+# 💾 SQLite：WAL 模式 (讀寫互不阻擋，訂閱服務等其他 process 也能同時讀)
+# 主鍵以 user_id 開頭 (WITHOUT ROWID 表就是照主鍵排序存放)，
+# 讀一位使用者 = 一次索引範圍查詢；儲存 = 同一個交易裡刪掉自己的列再寫入
+# 不存密碼：帳號驗證一律走 Google Sheets 的帳號索引
+# ==========================================
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS schedules (
+    user_id  TEXT NOT NULL,
+    event_id TEXT NOT NULL,
+    date     TEXT NOT NULL DEFAULT '',
+    time     TEXT NOT NULL DEFAULT '',
+    title    TEXT NOT NULL DEFAULT '',
+    location TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (user_id, event_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS carts (
+    user_id        TEXT NOT NULL,
+    cart_key       TEXT NOT NULL,
+    position       INTEGER NOT NULL,
+    title          TEXT NOT NULL DEFAULT '',
+    publisher      TEXT NOT NULL DEFAULT '',
+    price          TEXT NOT NULL DEFAULT '',
+    discount       TEXT NOT NULL DEFAULT '',
+    discount_price TEXT NOT NULL DEFAULT '',
+    status         TEXT NOT NULL DEFAULT '',
+    note           TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (user_id, cart_key)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS carts_by_user_position ON carts (user_id, position);
+"""
+CART_FIELDS = ["title", "publisher", "price", "discount", "discount_price", "status", "note"] # 對應 書名 ~ 備註
+CART_INSERT = f"INSERT OR REPLACE INTO carts (user_id, cart_key, position, {', '.join(CART_FIELDS)}) VALUES ({', '.join('?' * 10)})"
+
+class SqliteUserStore:
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        self.key = ("sqlite", os.path.abspath(path))
+        self._lock = threading.Lock()
+        # 整個 process 共用一條連線 (自己加鎖)；isolation_level=None 改成手動 BEGIN/COMMIT
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL") # WAL 模式下 NORMAL 就不會壞檔
+        self._conn.executescript(SCHEMA)
+
+    def _write(self, fn):
+        # fn(conn) 在同一個交易裡執行，失敗整個撤回
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                fn(self._conn)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _read(self, sql, params):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def load_schedule_ids(self, user_id):
+        rows = self._read("SELECT event_id FROM schedules WHERE user_id = ?", (str(user_id),))
+        return [r[0] for r in rows]
+
+    def save_schedule(self, user_id, user_pin, records):
+        user_id = str(user_id)
+        rows = [(user_id, str(rec[2]), *[str(v) for v in rec[3:7]]) for rec in records if str(rec[2]).strip()]
+        def replace(conn):
+            conn.execute("DELETE FROM schedules WHERE user_id = ?", (user_id,))
+            conn.executemany("INSERT OR REPLACE INTO schedules VALUES (?, ?, ?, ?, ?, ?)", rows)
+        self._write(replace)
+
+    # --- 行事曆：整份行程 (欄位同 SCHEDULE_COLS，不含密碼)，給訂閱服務用 ---
+    def load_schedule(self, user_id):
+        rows = self._read(
+            "SELECT user_id, '', event_id, date, time, title, location FROM schedules WHERE user_id = ?",
+            (str(user_id),),
+        )
+        return pd.DataFrame(rows, columns=SCHEDULE_COLS, dtype=str)
+
+    def load_cart(self, user_id):
+        rows = self._read(
+            f"SELECT {', '.join(CART_FIELDS)}, cart_key FROM carts WHERE user_id = ? ORDER BY position",
+            (str(user_id),),
+        )
+        if not rows: return pd.DataFrame()
+        return pd.DataFrame(rows, columns=CART_VIEW_COLS)
+
+    def _cart_rows(self, user_id, records, first_position=0):
+        rows = []
+        for pos, rec in enumerate(records, start=first_position):
+            if str(rec[2]).strip() == "": continue # 佔位列不用存
+            rows.append((user_id, str(rec[-1]), pos, *[str(v) for v in rec[2:9]]))
+        return rows
+
+    def append_cart(self, user_id, user_pin, records):
+        user_id = str(user_id)
+        def append(conn):
+            last = conn.execute("SELECT MAX(position) FROM carts WHERE user_id = ?", (user_id,)).fetchone()[0]
+            rows = self._cart_rows(user_id, records, first_position=0 if last is None else last + 1)
+            conn.executemany(CART_INSERT, rows)
+        self._write(append)
+
+    def save_cart(self, user_id, user_pin, records):
+        user_id = str(user_id)
+        rows = self._cart_rows(user_id, records)
+        def replace(conn):
+            conn.execute("DELETE FROM carts WHERE user_id = ?", (user_id,))
+            conn.executemany(CART_INSERT, rows)
+        self._write(replace)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+# ==========================================
+# 🪞 主要儲存 + 背景同步一份到另一邊 (例如 sqlite 為主、Google Sheets 當匯出備份)
+# 頁面只等主要儲存寫完；同步用單一背景執行緒依序送出，失敗只記 log
+# ==========================================
+class MirroredUserStore:
+    def __init__(self, primary, mirror):
+        self.primary = primary
+        self.mirror = mirror
+        self.key = ("mirrored", primary.key, mirror.key)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="user-store-mirror")
+
+    def _mirror(self, method, *args):
+        def run():
+            try:
+                getattr(self.mirror, method)(*args)
+            except Exception as e:
+                print(f"同步備份失敗 ({method}): {e}")
+        self._executor.submit(run)
+
+    def load_schedule_ids(self, user_id):
+        return self.primary.load_schedule_ids(user_id)
+
+    def save_schedule(self, user_id, user_pin, records):
+        self.primary.save_schedule(user_id, user_pin, records)
+        self._mirror("save_schedule", user_id, user_pin, records)
+
+    def load_schedule(self, user_id):
+        return self.primary.load_schedule(user_id)
+
+    def load_cart(self, user_id):
+        return self.primary.load_cart(user_id)
+
+    def append_cart(self, user_id, user_pin, records):
+        self.primary.append_cart(user_id, user_pin, records)
+        self._mirror("append_cart", user_id, user_pin, records)
+
+    def save_cart(self, user_id, user_pin, records):
+        self.primary.save_cart(user_id, user_pin, records)
+        self._mirror("save_cart", user_id, user_pin, records)
+
+# ==========================================
+# ⚙️ 設定 (Streamlit secrets 的 [user_store] 優先，其次 secrets.json；預設 Google Sheets)
+# ==========================================
+def load_store_settings():
+    return load_settings("user_store")
+
+# --- 設定裡的開關：secrets.json 或環境變數常寫成字串 "false"，不能直接 bool() ---
+def parse_flag(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return bool(value)
+
+def make_store(backend="sheets", path=None, mirror=False):
+    if backend == "sheets":
+        return SheetsUserStore()
+    if backend == "sqlite":
+        store = SqliteUserStore(path or DEFAULT_DB_PATH)
+        return MirroredUserStore(store, SheetsUserStore()) if mirror else store
+    raise ValueError(f"不支援的 user_store backend: {backend}")
+
+def get_user_store():
+    settings = load_store_settings()
+    backend = settings.get("backend", "sheets")
+    path = settings.get("path")
+    mirror = parse_flag(settings.get("mirror", False))
+    key = (backend, path, mirror)
+    with _lock:
+        if key not in _stores:
+            _stores[key] = make_store(backend, path, mirror)
+        return _stores[key]
+
+# ==========================================
+# 📥 從 Google Sheets 匯入既有資料到 SQLite (切換 backend 前跑一次)
+# 兩張 users 表各整份讀一次，依使用者分組後寫入
+# ==========================================
+def import_from_sheets(store, sheets=None):
+    sheets = sheets or SheetsUserStore()
+
+    data = sheets._worksheet(sheets.calendar_sheet).get_all_values()
+    schedules = {}
+    for row in data[1:]:
+        rec = [str(v).strip() for v in (row + [""] * len(SCHEDULE_COLS))[:len(SCHEDULE_COLS)]]
+        if rec[0] and rec[2]:
+            schedules.setdefault(rec[0], []).append(rec)
+    for user_id, records in schedules.items():
+        store.save_schedule(user_id, "", records)
+
+    data = sheets._worksheet(sheets.cart_sheet).get_all_values()
+    carts = {}
+    for row in data[1:]:
+        rec = [str(v) for v in (row + [""] * len(CART_COLS))[:len(CART_COLS)]]
+        if rec[0].strip() and rec[2].strip():
+            if not rec[-1].strip(): rec[-1] = new_cart_key()
+            carts.setdefault(rec[0].strip(), []).append(rec)
+    for user_id, records in carts.items():
+        store.save_cart(user_id, "", records)
+
+    print(f"✅ 匯入完成：行事曆 {len(schedules)} 位使用者、書單 {len(carts)} 位使用者")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="使用者資料儲存工具")
+    parser.add_argument("--db", default=None, help=f"SQLite 檔案路徑 (預設讀 [user_store] path，或 {DEFAULT_DB_PATH})")
+    parser.add_argument("--import-sheets", action="store_true", help="把 Google Sheets 的行事曆與書單匯入 SQLite")
+    args = parser.parse_args()
+    if args.import_sheets:
+        import_from_sheets(SqliteUserStore(args.db or load_store_settings().get("path") or DEFAULT_DB_PATH))
+    else:
+        parser.print_help()
@@ -1,14 +1,16 @@
 import streamlit as st
 import gspread
-from oauth2client.service_account import ServiceAccountCredentials
 import pandas as pd
-import datetime
-from datetime import timedelta
+import numpy as np
 from streamlit_calendar import calendar
-from ics import Calendar, Event
-import time
-import re
-import json
+import zlib
+from gsheet_client import get_gspread_client
+from user_directory import get_user_directory, check_pin
+from user_store import get_user_store, schedule_records
+from catalog_source import load_prepared_catalog
+from exports import build_ics, build_csv, build_txt
+from feed_server import load_feed_settings, feed_url
+from planner import find_conflicts, suggest_non_conflicting, travel_minutes, plan_itinerary
 
 # 1. 頁面基本設定
 st.set_page_config(
@@ -248,205 +250,76 @@ st.markdown("""
 # ⚙️ 設定區
 # ==========================================
 SHEET_NAME_MASTER = "2026國際書展行事曆" 
-WORKSHEETS_TO_LOAD = ["國際書展"]
 SHEET_NAME_USERS_DB = "2026國際書展使用者行事曆"
 WORKSHEET_USERS_TAB = "users" 
 
 # --- 初始化 Session State ---
 if "calendar_focus_date" not in st.session_state: st.session_state.calendar_focus_date = "2026-02-04" 
-if "prev_selection_counts" not in st.session_state: st.session_state.prev_selection_counts = {}
 if "user_id" not in st.session_state: st.session_state.user_id = ""
 if "user_pin" not in st.session_state: st.session_state.user_pin = ""
 if "is_logged_in" not in st.session_state: st.session_state.is_logged_in = False
 if "is_guest" not in st.session_state: st.session_state.is_guest = False 
-if "saved_ids" not in st.session_state: st.session_state.saved_ids = []
+if "saved_ids" not in st.session_state: st.session_state.saved_ids = set() # 已勾選的活動 id (整個 session 共用一份 set)
 if "save_success_msg" not in st.session_state: st.session_state.save_success_msg = None # 用來控制成功訊息顯示
-
-# --- 連線功能 ---
-def get_gspread_client():
-    scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-    try:
-        if "gcp_service_account" in st.secrets:
-            creds_dict = dict(st.secrets["gcp_service_account"])
-        else:
-            with open("secrets.json", "r") as f:
-                creds_dict = json.load(f)
-                if "gcp_service_account" in creds_dict:
-                    creds_dict = creds_dict["gcp_service_account"]
-
-        if "private_key" in creds_dict:
-             creds_dict["private_key"] = creds_dict["private_key"].replace("\\n", "\n")
-        
-        creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-        return gspread.authorize(creds)
-    except Exception as e:
-        print(f"連線錯誤: {e}")
-        return None
+if "editor_version" not in st.session_state: st.session_state.editor_version = 0 # 程式直接改 saved_ids 時 +1，讓表格重新讀取勾選狀態
 
 # --- 資料讀取 (自動抓取所有分頁版) ---
-@st.cache_data(ttl=300)
+# 背景執行緒 (catalog_source) 會定期更新總表，這裡直接拿最後一份成功的資料，不用等下載
+# 讀取順序：記憶體 -> 硬碟 Parquet 快照 -> Google 試算表 -> 隨附的 CSV (試算表連不上時也能開)
+# 來源可在 secrets 的 [catalog] 設定 (origin = "sheets" / "csv" / "parquet")
+# ID、時間解析等整理工作也在那邊做：每份總表只整理一次，之後每次重跑拿到的是同一個物件
 def load_master_data():
-    client = get_gspread_client()
-    if not client: return None, "連線失敗"
-
     try:
-        spreadsheet = client.open(SHEET_NAME_MASTER)
-        all_frames = []
-        STANDARD_COLS = ["日期", "時間", "活動名稱", "地點", "主講人", "主持人", "類型", "備註", "詳細內容"]
-
-        # 🔥 修改點 1：取得該試算表內「所有的」分頁物件
-        all_worksheets = spreadsheet.worksheets()
-
-        for ws in all_worksheets:
-            ws_name = ws.title
-            
-            # 🔥 修改點 2：過濾掉不相關的分頁 (例如存使用者的 users，或是空白預設頁)
-            # 如果您的主表裡面沒有放 users 資料，這行其實也可以留著當保險
-            if ws_name in ["users", "工作表1", "樣板", "Sheet1"]: 
-                continue
-
-            try:
-                data = ws.get_all_values()
-                if len(data) < 2: continue # 跳過沒資料的分頁
-                
-                df = pd.DataFrame(data[1:], columns=data[0])
-                
-                # 將「分頁名稱」作為「來源」，這樣您就知道是哪個出版社的活動
-                df['來源'] = ws_name 
-                
-                df.columns = [c.strip() for c in df.columns]
-                
-                if "主講人" not in df.columns and "講者" in df.columns:
-                    df.rename(columns={"講者": "主講人"}, inplace=True)
-
-                for col in STANDARD_COLS:
-                    if col not in df.columns: df[col] = "" 
-                
-                df = df.fillna("")
-                all_frames.append(df)
-            except Exception as e:
-                print(f"分頁 {ws_name} 讀取失敗: {e}")
-                pass
-
-        if not all_frames: return pd.DataFrame(), "無資料"
-        
-        # 合併所有資料
-        final_df = pd.concat(all_frames, ignore_index=True)
-        
-        # 產生唯一 ID
-        final_df['id'] = final_df.apply(lambda x: f"{x['日期']}_{x['時間']}_{x['活動名稱']}_{x.name}", axis=1)
-        
-        return final_df, "Success"
-        
+        return load_prepared_catalog(SHEET_NAME_MASTER)
     except Exception as e:
         return None, str(e)
 
-# --- 使用者資料讀取 (修正版：過濾空白幽靈 ID) ---
+# --- 匯出檔案 (依勾選內容快取，勾選沒變就不重新產生) ---
+@st.cache_data(max_entries=256, show_spinner=False)
+def get_export_files(selection_key, _selected_df):
+    return {"ics": build_ics(_selected_df), "csv": build_csv(_selected_df), "txt": build_txt(_selected_df)}
+
+# --- 勾選狀態 ---
+# 程式直接換掉整份勾選 (登入、儲存、自動排行程…) 時用這個，順便讓表格重新讀取勾選狀態
+def replace_saved_ids(ids):
+    st.session_state.saved_ids = set() if ids is None else set(ids)
+    st.session_state.editor_version += 1
+
+# 表格的回呼：只看 edited_rows 裡被改到的列 (位置 -> {"參加": True/False})，直接更新 set
+# edited_rows 是這個表格建立以來的累計修改，以「最後的值」套用，重複套用結果也一樣
+def apply_day_edits(editor_key, row_ids, date_str):
+    edits = st.session_state[editor_key].get("edited_rows", {})
+    saved = st.session_state.saved_ids
+    for pos, change in edits.items():
+        if "參加" not in change: continue
+        if change["參加"]:
+            saved.add(row_ids[int(pos)])
+        else:
+            saved.discard(row_ids[int(pos)])
+    st.session_state.calendar_focus_date = date_str
+
+# --- 使用者資料讀取 (存在哪裡由 user_store 決定：Google Sheets 或 SQLite) ---
 def load_user_saved_ids(user_id):
-    client = get_gspread_client()
-    if not client: return []
     try:
-        sh = client.open(SHEET_NAME_USERS_DB)
-        ws = sh.worksheet(WORKSHEET_USERS_TAB)
-        data = ws.get_all_values()
-        if len(data) < 2: return []
-        df = pd.DataFrame(data[1:], columns=data[0])
-        
-        if "User_ID" in df.columns and "ID" in df.columns:
-            user_data = df[df["User_ID"] == str(user_id)]
-            
-            # 🔥 關鍵修正：過濾掉 ID 是空字串的資料 (踢掉佔位用的空行)
-            # 1. 將 ID 欄位轉為字串並去除空白
-            clean_ids = user_data["ID"].fillna("").astype(str).str.strip()
-            # 2. 只回傳「不是空白」的 ID
-            return clean_ids[clean_ids != ""].tolist()
-            
-        return []
+        return get_user_store().load_schedule_ids(user_id)
     except Exception as e:
         print(f"讀取失敗: {e}")
         return []
 
-# --- 儲存功能 (含密碼寫入版) ---
+# --- 儲存功能 (Sheets 只改自己的列；SQLite 同一個交易換掉自己的資料) ---
 def save_user_schedule_to_cloud(user_id, user_pin, selected_df):
-    client = get_gspread_client()
-    if not client: return False, "連線失敗"
     try:
-        sh = client.open(SHEET_NAME_USERS_DB)
-        ws = sh.worksheet(WORKSHEET_USERS_TAB)
-        
-        # 定義欄位：多加了 Password
-        TARGET_COLS = ["User_ID", "Password", "ID", "日期", "時間", "活動名稱", "地點"]
-        existing_data = ws.get_all_values()
-        
-        df_clean = pd.DataFrame(columns=TARGET_COLS)
-        if existing_data:
-            if str(existing_data[0][0]).strip() == "User_ID":
-                if len(existing_data) > 1:
-                    df_clean = pd.DataFrame(existing_data[1:], columns=TARGET_COLS)
-            else:
-                valid_data = [row for row in existing_data if any(field.strip() for field in row)]
-                if valid_data:
-                    df_clean = pd.DataFrame(valid_data, columns=TARGET_COLS)
-
-        # 準備新資料
-        new_records_df = pd.DataFrame()
-        count = len(selected_df)
-        new_records_df["User_ID"] = [str(user_id)] * count
-        new_records_df["Password"] = [str(user_pin)] * count # 寫入密碼
-        
-        col_mapping = {"id": "ID", "日期": "日期", "時間": "時間", "活動名稱": "活動名稱", "地點": "地點"}
-        for src_col, target_col in col_mapping.items():
-            if src_col in selected_df.columns:
-                new_records_df[target_col] = selected_df[src_col].values
-            else:
-                new_records_df[target_col] = ""
-        new_records_df = new_records_df[TARGET_COLS]
-
-        # 剔除舊資料
-        if not df_clean.empty:
-            df_keep = df_clean[df_clean["User_ID"].astype(str) != str(user_id)]
-        else:
-            df_keep = pd.DataFrame(columns=TARGET_COLS)
-
-        df_final = pd.concat([df_keep, new_records_df], ignore_index=True)
-        df_final = df_final.fillna("")
-        
-        final_values = [TARGET_COLS] + df_final.values.tolist()
-        ws.clear()
-        ws.update(range_name='A1', values=final_values)
+        get_user_store().save_schedule(user_id, user_pin, schedule_records(user_id, user_pin, selected_df))
         return True, "儲存成功"
+    except ConnectionError:
+        return False, "連線失敗"
     except gspread.WorksheetNotFound:
         return False, f"找不到分頁 '{WORKSHEET_USERS_TAB}'"
     except Exception as e:
         return False, f"儲存失敗: {str(e)}"
 
-def parse_datetime_range(date_str, time_str):
-    try:
-        clean_date = str(date_str).split(" ")[0].strip()
-        clean_time = str(time_str).replace("：", ":").replace("~", "-").replace(" ", "")
-        if "-" in clean_time:
-            parts = clean_time.split("-")
-            start_t = parts[0]; end_t = parts[1]
-        else:
-            start_t = clean_time; end_t = clean_time 
-        
-        fmt = "%Y-%m-%d %H:%M"
-        try:
-            start_dt = datetime.datetime.strptime(f"{clean_date} {start_t}", fmt)
-            end_dt = datetime.datetime.strptime(f"{clean_date} {end_t}", fmt)
-        except:
-             # 如果解析失敗嘗試秒數
-            fmt_sec = "%Y-%m-%d %H:%M:%S"
-            try:
-                start_dt = datetime.datetime.strptime(f"{clean_date} {start_t}", fmt_sec)
-                end_dt = datetime.datetime.strptime(f"{clean_date} {end_t}", fmt_sec)
-            except:
-                return None, None
-        return start_dt, end_dt
-    except:
-        return None, None
-
 # --- 統一登入驗證 (行事曆版：會去檢查買書資料庫) ---
+# 兩邊都改查共用的帳號索引 (user_directory)，不再每次登入下載兩整張表
 def check_login(user_id, input_pin):
     client = get_gspread_client()
     if not client: return False, [], "連線失敗"
@@ -456,61 +329,43 @@ def check_login(user_id, input_pin):
     
     try:
         # --- 1. 連線到「行事曆」資料庫 (自己家) ---
-        sh_cal = client.open(SHEET_NAME_USERS_DB)
-        try:
-            ws_cal = sh_cal.worksheet(WORKSHEET_USERS_TAB)
-        except:
-            ws_cal = sh_cal.add_worksheet(title=WORKSHEET_USERS_TAB, rows=1000, cols=10)
-
-        data_cal = ws_cal.get_all_values()
         HEADERS = ["User_ID", "Password", "ID", "日期", "時間", "活動名稱", "地點"]
-        
-        if not data_cal:
-            ws_cal.update(range_name='A1', values=[HEADERS])
-            data_cal = [HEADERS]
-
-        df_cal = pd.DataFrame(data_cal[1:], columns=data_cal[0])
+        cal_dir = get_user_directory(SHEET_NAME_USERS_DB, WORKSHEET_USERS_TAB, headers=HEADERS, rows=1000, cols=10)
         
         # --- 2. 檢查自己家是否有此帳號 ---
-        if "User_ID" in df_cal.columns:
-            user_rows = df_cal[df_cal["User_ID"] == user_id]
-            if not user_rows.empty:
-                stored_pin = str(user_rows.iloc[0]["Password"]).strip()
-                if stored_pin == "" or stored_pin == input_pin:
-                    return True, user_rows["ID"].tolist(), "登入成功"
-                else:
-                    return False, [], "⚠️ 密碼錯誤或此帳號已存在"
+        account = cal_dir.lookup(user_id)
+        if account is not None:
+            if not account["has_pin"] or check_pin(account, input_pin):
+                # 已存的行程由登入後的同步區塊 (load_user_saved_ids) 讀取
+                return True, [], "登入成功"
+            else:
+                return False, [], "⚠️ 密碼錯誤或此帳號已存在"
 
         # --- 3. 自己家沒有，去檢查「買書」資料庫 (鄰居家) ---
         try:
             # 注意：這裡要填寫您「買書 App」的 Sheet 名稱
             SHEET_NAME_SHOP = "2026國際書展使用者採購清單"
-            sh_shop = client.open(SHEET_NAME_SHOP)
-            ws_shop = sh_shop.worksheet("users")
-            data_shop = ws_shop.get_all_values()
-            
-            if len(data_shop) > 1:
-                df_shop = pd.DataFrame(data_shop[1:], columns=data_shop[0])
-                if "User_ID" in df_shop.columns:
-                    shop_user = df_shop[df_shop["User_ID"] == user_id]
-                    if not shop_user.empty:
-                        # 🔥 發現了！他在買書那邊有帳號！
-                        other_pin = str(shop_user.iloc[0]["Password"]).strip()
-                        
-                        if other_pin == input_pin:
-                            # 密碼正確 -> 自動在「行事曆」這邊幫他註冊
-                            new_row = [user_id, input_pin] + [""] * (len(HEADERS) - 2)
-                            ws_cal.append_row(new_row)
-                            return True, [], "登入成功 (已同步買書帳號)"
-                        else:
-                            return False, [], "⚠️ 此帳號已在「買書小幫手」註冊，請輸入該帳號的正確密碼！"
+            shop_account = get_user_directory(SHEET_NAME_SHOP, "users").lookup(user_id)
+            if shop_account is not None:
+                # 🔥 發現了！他在買書那邊有帳號！
+                if check_pin(shop_account, input_pin):
+                    # 密碼正確 -> 自動在「行事曆」這邊幫他註冊
+                    new_row = [user_id, input_pin] + [""] * (len(HEADERS) - 2)
+                    account = cal_dir.register(user_id, input_pin, new_row)
+                    if account["has_pin"] and not check_pin(account, input_pin):
+                        return False, [], "⚠️ 密碼錯誤或此帳號已存在" # 剛好被別人搶先註冊
+                    return True, [], "登入成功 (已同步買書帳號)"
+                else:
+                    return False, [], "⚠️ 此帳號已在「買書小幫手」註冊，請輸入該帳號的正確密碼！"
         except Exception as e:
             print(f"跨表檢查失敗: {e}")
             pass
 
         # --- 4. 兩邊都沒有 -> 全新註冊 ---
         new_row = [user_id, input_pin] + [""] * (len(HEADERS) - 2)
-        ws_cal.append_row(new_row)
+        account = cal_dir.register(user_id, input_pin, new_row)
+        if account["has_pin"] and not check_pin(account, input_pin):
+            return False, [], "⚠️ 密碼錯誤或此帳號已存在" # 剛好被別人搶先註冊
         return True, [], "新帳號註冊成功"
         
     except Exception as e:
@@ -559,7 +414,7 @@ if not st.session_state.is_logged_in:
                     is_valid, saved_ids, msg = check_login(input_id, input_pin)
                     
                     if is_valid:
-                        st.session_state.saved_ids = saved_ids if saved_ids is not None else []
+                        replace_saved_ids(saved_ids)
                         st.session_state.user_id = input_id
                         st.session_state.user_pin = input_pin 
                         st.session_state.is_guest = False
@@ -583,7 +438,7 @@ if st.session_state.is_logged_in and not st.session_state.get("is_guest", False)
     check_login(st.session_state.user_id, st.session_state.user_pin)
     
     # 2. 讀取舊資料
-    st.session_state.saved_ids = load_user_saved_ids(st.session_state.user_id)
+    replace_saved_ids(load_user_saved_ids(st.session_state.user_id))
     
     # 3. 標記已同步
     st.session_state.synced_calendar = True
@@ -605,7 +460,7 @@ with st.sidebar:
         st.session_state.user_id = ""
         
         # 2. 清除行事曆專用變數
-        st.session_state.saved_ids = []
+        replace_saved_ids([])
         st.session_state.save_success_msg = None
         st.session_state.calendar_focus_date = "2026-02-04" # 重置日期
         
@@ -623,16 +478,18 @@ with st.sidebar:
         # 2. 重新整理
         st.rerun()
 
-raw_df, msg = load_master_data()
-if raw_df is None or raw_df.empty:
+catalog, msg = load_master_data()
+if catalog is None or catalog.df.empty:
     st.error(f"⚠️ 資料讀取失敗：{msg}")
     st.stop()
 
-proc_df = raw_df.copy()
-proc_df[['start_dt', 'end_dt']] = proc_df.apply(lambda x: pd.Series(parse_datetime_range(x['日期'], x['時間'])), axis=1)
+proc_df = catalog.df # 多個使用者共用，只讀不改
 
-all_selected_ids = []
-current_selection_counts = {}
+# 之前存的行程可能是舊格式的 ID (日期_時間_活動名稱_列號)：換成目前的 ID，下次儲存就會寫回新格式
+if not st.session_state.saved_ids <= catalog.id_set:
+    resolved = catalog.resolve_ids(st.session_state.saved_ids)
+    if resolved != st.session_state.saved_ids:
+        replace_saved_ids(resolved)
 
 # 標題
 st.title("2026台北國際書展行事曆小幫手")
@@ -644,19 +501,175 @@ if st.session_state.is_guest:
 st.subheader("✅ 勾選活動 ")
 
 with st.expander("🔎 進階篩選", expanded=False):
-    c1, c2, c3 = st.columns(3)
-    with c1: f_loc = st.multiselect("地點", options=sorted(list(set(proc_df['地點'].astype(str)))))
-    with c2: f_type = st.multiselect("類型", options=sorted(list(set(proc_df['類型'].astype(str)))))
-    with c3: f_key = st.text_input("關鍵字")
+    show_src = len(catalog.options['來源']) > 1 # 只有一個來源時不顯示
+    f_cols = st.columns(4 if show_src else 3)
+    with f_cols[0]: f_loc = st.multiselect("地點", options=catalog.options['地點'])
+    with f_cols[1]: f_type = st.multiselect("類型", options=catalog.options['類型'])
+    f_src = []
+    if show_src:
+        with f_cols[2]: f_src = st.multiselect("來源", options=catalog.options['來源'])
+    with f_cols[-1]: f_key = st.text_input("關鍵字", placeholder="活動、講者、地點、內容")
+
+# 查預先建好的索引 (活動名稱、主講人、主持人、地點、詳細內容)，空白分隔多個關鍵字
+key_mask = catalog.search_index.mask(f_key, len(proc_df)) if f_key else None
+# 各選項的遮罩做 OR / AND，同時算出每個選項的場次數
+mask, facet_counts = catalog.filter({'地點': f_loc, '類型': f_type, '來源': f_src}, key_mask)
 
-mask = [True] * len(proc_df)
-if f_loc: mask &= proc_df['地點'].isin(f_loc)
-if f_type: mask &= proc_df['類型'].isin(f_type)
-if f_key: 
-    mask &= (proc_df['活動名稱'].str.contains(f_key, case=False) | proc_df['主講人'].str.contains(f_key, case=False))
+with st.sidebar:
+    with st.expander("📊 場次統計", expanded=False):
+        st.caption(f"符合篩選：{int(mask.sum())} 場")
+        for col in ['日期', '類型', '地點']:
+            lines = [f"{v[5:] if col == '日期' else v}：{n}" for v, n in facet_counts[col].items() if n]
+            st.caption(f"**{col}**　" + "　".join(lines))
+
+# --- 衝堂檢查 (已勾選的場次，含場館之間的步行時間) ---
+selected_now = proc_df[proc_df['id'].isin(st.session_state.saved_ids)]
+conflict_pairs = find_conflicts(selected_now)
+
+if conflict_pairs:
+    st.warning(f"⚠️ 有 {len(conflict_pairs)} 組場次時間重疊或來不及走過去 (表格中標示 ⚠️)")
+    with st.expander("查看衝堂場次", expanded=False):
+        info = selected_now.set_index('id')
+        for a, b in conflict_pairs:
+            ra, rb = info.loc[a], info.loc[b]
+            walk = travel_minutes(ra['地點'], rb['地點'])
+            walk_txt = f"（步行約 {walk} 分鐘）" if walk else ""
+            st.caption(
+                f"{str(ra['日期'])[5:]}　{ra['時間']} {ra['活動名稱']} @ {ra['地點']}"
+                f"　↔　{rb['時間']} {rb['活動名稱']} @ {rb['地點']}{walk_txt}"
+            )
+        if st.button("✂️ 只保留不衝堂的場次", help="每天挑出彼此不衝堂 (含場館之間的步行時間) 的最多場次"):
+            keep = suggest_non_conflicting(selected_now)
+            # 沒有時間資料的場次不參與檢查，照樣保留
+            no_time = selected_now.loc[selected_now['start_dt'].isna() | selected_now['end_dt'].isna(), 'id'].tolist()
+            replace_saved_ids(no_time + keep)
+            st.rerun()
 
-filtered_df = proc_df[mask]
-unique_dates = sorted(list(set(filtered_df['日期'].unique())))
+# --- 自動排行程：依使用者給的分數，每天挑出不衝堂、總分最高的場次組合 ---
+with st.expander("🧭 自動排行程", expanded=False):
+    p_left, p_right = st.columns([0.4, 0.6])
+    with p_left:
+        plan_date = st.selectbox("日期", catalog.dates, format_func=lambda d: str(d)[5:], key="plan_date")
+        use_travel = st.checkbox("考慮場館之間的步行時間", value=True, key="plan_travel")
+        fill_gaps = st.checkbox("用沒勾選的活動補空檔", value=False, key="plan_fill")
+    type_weights = {}
+    if fill_gaps:
+        with p_right:
+            st.caption("沒勾選的活動，各類型的分數 (0 = 不排)")
+            for t in catalog.options['類型']:
+                type_weights[t] = st.slider(t, 0, 5, 1, key=f"plan_w_{t}")
+
+    day_all = proc_df.iloc[catalog.date_index[plan_date]]
+    is_ticked = day_all['id'].isin(st.session_state.saved_ids).values
+    ticked = day_all[is_ticked]
+
+    prio = {}
+    if not ticked.empty:
+        st.caption("已勾選場次的分數 (1~10，越想參加分數越高)")
+        # 勾選的場次變了就換一個 key，避免舊的修改對到別列
+        prio_key = f"plan_prio_{plan_date}_{zlib.crc32('|'.join(ticked['id']).encode('utf-8'))}"
+        prio_df = st.data_editor(
+            pd.DataFrame({"分數": 5, "時間": ticked['時間'], "活動名稱": ticked['活動名稱'], "地點": ticked['地點'], "id": ticked['id']}),
+            column_config={
+                "分數": st.column_config.NumberColumn("分數", min_value=1, max_value=10, step=1, width="small"),
+                "時間": st.column_config.TextColumn("時間", width="small", disabled=True),
+                "活動名稱": st.column_config.TextColumn("活動名稱", width="medium", disabled=True),
+                "地點": st.column_config.TextColumn("地點", width="small", disabled=True),
+                "id": None
+            },
+            hide_index=True,
+            key=prio_key
+        )
+        prio = dict(zip(prio_df['id'], prio_df['分數'].fillna(5)))
+
+    if ticked.empty and not fill_gaps:
+        st.info("請先勾選想參加的活動，或開啟「用沒勾選的活動補空檔」")
+    else:
+        weights = np.where(
+            is_ticked,
+            day_all['id'].map(prio).fillna(0).values,
+            day_all['類型'].map(type_weights).fillna(0).values,
+        )
+        plan_ids, plan_score = plan_itinerary(day_all, weights, with_travel=use_travel)
+        plan_set = set(plan_ids)
+        ticked_set = set(ticked['id'])
+        st.caption(
+            f"建議行程：{len(plan_ids)} 場，總分 {plan_score:g}"
+            f"（新增 {len(plan_set - ticked_set)} 場、拿掉 {len(ticked_set - plan_set)} 場）"
+        )
+        plan_df = day_all.set_index('id').loc[plan_ids]
+        st.dataframe(plan_df[['時間', '活動名稱', '地點']], hide_index=True, use_container_width=True)
+        if st.button(f"📌 用建議行程取代 {str(plan_date)[5:]} 的勾選", disabled=plan_set == ticked_set):
+            replace_saved_ids((st.session_state.saved_ids - set(day_all['id'])) | plan_set)
+            st.rerun()
+
+# 每天的活動列號已預先排好，這裡只挑出符合篩選的列
+day_masks = {d: mask[rows] for d, rows in catalog.date_index.items()}
+unique_dates = [d for d in catalog.dates if day_masks[d].any()]
+
+# --- 每天的勾選表格 (fragment)：勾選時只重跑這一天的表格與計數，
+# 不重跑登入同步、資料讀取、行事曆與下載檔 (按「更新行事曆」或其他按鈕時才整頁更新) ---
+@st.fragment
+def render_day_tab(date_str, day_mask):
+    # 衝堂標示只看目前的勾選，fragment 重跑時也是最新的
+    selected = proc_df[proc_df['id'].isin(st.session_state.saved_ids)]
+    conflict_ids = {cid for pair in find_conflicts(selected) for cid in pair}
+
+    # --- 🔥 新增：狀態提示區塊 (放在表格正上方) ---
+    # 計算目前總共選了幾場
+    current_total = len(st.session_state.saved_ids)
+    
+    c_info, c_tip = st.columns([0.35, 0.65])
+    with c_info:
+        # 顯示已選數量 (使用珊瑚色強調)
+        st.markdown(
+            f"<div style='color: #FF8C69; font-weight: bold; font-size: 1.1rem; padding-top: 5px;'>"
+            f"已勾選：{current_total} 場"
+            f"</div>", 
+            unsafe_allow_html=True
+        )
+    with c_tip:
+        # 顯示操作教學
+        st.caption("勾選後請待場次數量更新後，再勾選下一場")
+    
+    # ---------------------------------------------
+
+    # 當天的表格已預先建好 (已按時間排序)，這裡只套用篩選
+    day_df = catalog.day_frames[date_str][day_mask]
+    row_ids = day_df['id'].tolist()
+    
+    # 🔥 修改 1：要把 "id" 加回來，不然程式抓不到是哪一場
+    cols_to_show = ["參加", "衝堂", "時間", "活動名稱","來源", "地點", "主講人", "id"]
+    saved = st.session_state.saved_ids
+    view_df = day_df.assign(
+        參加=[x in saved for x in row_ids],
+        衝堂=["⚠️" if x in conflict_ids else "" for x in row_ids],
+    )[cols_to_show]
+
+    # 篩選條件改變時列的位置會變，key 加上這天的列組合，edited_rows 的位置才對得起來
+    filter_sig = zlib.crc32("|".join(row_ids).encode("utf-8"))
+    editor_key = f"editor_{date_str}_{st.session_state.editor_version}_{filter_sig}"
+    st.data_editor(
+        view_df, 
+        column_config={
+            "參加": st.column_config.CheckboxColumn("參加", width="small"),
+            "衝堂": st.column_config.TextColumn("衝堂", width="small", disabled=True),
+            
+            # 鎖住資訊欄位
+            "時間": st.column_config.TextColumn("時間", width="small", disabled=True),
+            "活動名稱": st.column_config.TextColumn("活動名稱", width="medium", disabled=True),
+            "來源": st.column_config.TextColumn("來源", width="small", disabled=True),
+            "地點": st.column_config.TextColumn("地點", width="small", disabled=True),
+            "主講人": st.column_config.TextColumn("主講人", width="medium", disabled=True),
+            
+            # 🔥 修改 2：將 id 設為 None，讓它隱藏不顯示
+            "id": None
+        },
+        hide_index=True,
+        key=editor_key,
+        on_change=apply_day_edits,
+        args=(editor_key, row_ids, date_str)
+    )
 
 if not unique_dates:
     st.info("沒有符合條件的活動")
@@ -666,66 +679,8 @@ else:
     
     for i, date_str in enumerate(unique_dates):
         with tabs[i]:
-            # --- 🔥 新增：狀態提示區塊 (放在表格正上方) ---
-            # 計算目前總共選了幾場
-            current_total = len(st.session_state.saved_ids)
-            
-            c_info, c_tip = st.columns([0.35, 0.65])
-            with c_info:
-                # 顯示已選數量 (使用珊瑚色強調)
-                st.markdown(
-                    f"<div style='color: #FF8C69; font-weight: bold; font-size: 1.1rem; padding-top: 5px;'>"
-                    f"已勾選：{current_total} 場"
-                    f"</div>", 
-                    unsafe_allow_html=True
-                )
-            with c_tip:
-                # 顯示操作教學
-                st.caption("勾選後請待場次數量更新後，再勾選下一場")
-            
-            # ---------------------------------------------
-
-            day_df = filtered_df[filtered_df['日期'] == date_str].copy().sort_values(by='時間')
-            if "參加" not in day_df.columns:
-                day_df.insert(0, "參加", day_df['id'].isin(st.session_state.saved_ids))
-            
-            # 🔥 修改 1：要把 "id" 加回來，不然程式抓不到是哪一場
-            cols_to_show = ["參加", "時間", "活動名稱","來源", "地點", "主講人", "id"]
+            render_day_tab(date_str, day_masks[date_str])
 
-            edited_day_df = st.data_editor(
-                day_df[cols_to_show], 
-                column_config={
-                    "參加": st.column_config.CheckboxColumn("參加", width="small"),
-                    
-                    # 鎖住資訊欄位
-                    "時間": st.column_config.TextColumn("時間", width="small", disabled=True),
-                    "活動名稱": st.column_config.TextColumn("活動名稱", width="medium", disabled=True),
-                    "來源": st.column_config.TextColumn("來源", width="small", disabled=True),
-                    "地點": st.column_config.TextColumn("地點", width="small", disabled=True),
-                    "主講人": st.column_config.TextColumn("主講人", width="medium", disabled=True),
-                    
-                    # 🔥 修改 2：將 id 設為 None，讓它隱藏不顯示
-                    "id": None
-                },
-                hide_index=True,
-                key=f"editor_{date_str}"
-            )
-
-            visible_ids = day_df['id'].tolist()
-            ticked_ids = edited_day_df[edited_day_df["參加"] == True]['id'].tolist()
-            
-            current_saved_set = set(st.session_state.saved_ids)
-            current_saved_set.update(ticked_ids)
-            ids_to_remove = set(visible_ids) - set(ticked_ids)
-            current_saved_set = current_saved_set - ids_to_remove
-            st.session_state.saved_ids = list(current_saved_set)
-            
-            current_count = len(ticked_ids)
-            current_selection_counts[date_str] = current_count
-            if current_count != st.session_state.prev_selection_counts.get(date_str, 0):
-                st.session_state.calendar_focus_date = date_str
-
-st.session_state.prev_selection_counts = current_selection_counts
 st.markdown("---")
 
 # --- 2. 行程週曆 ---
@@ -742,7 +697,10 @@ if st.session_state.save_success_msg:
     st.session_state.save_success_msg = None 
 
 # 直接放儲存按鈕，不分欄了，或者用空白欄位推到右邊
-_, c_save = st.columns([0.7, 0.3]) # 左邊留白
+_, c_refresh, c_save = st.columns([0.4, 0.3, 0.3]) # 左邊留白
+with c_refresh:
+    # 勾選只會更新表格 (fragment)，按這裡 (或任何按鈕) 整頁重跑，行事曆與下載檔才會跟上
+    st.button("🔄 更新行事曆", use_container_width=True)
 with c_save:
     if st.session_state.is_guest:
         st.button("💾 儲存 (訪客無法使用)", disabled=True, use_container_width=True)
@@ -757,7 +715,7 @@ with c_save:
                 )
                 if success:
                     st.session_state.save_success_msg = "儲存成功！行程已更新"
-                    st.session_state.saved_ids = final_selected['id'].tolist()
+                    replace_saved_ids(final_selected['id'])
                     st.rerun() 
                 else:
                     st.error(f"儲存失敗: {s_msg}")
@@ -801,29 +759,24 @@ st.markdown("---")
 st.subheader("🎒 下載行事曆檔案 ")
 st.caption("ics檔可以匯入google行事曆，表格csv檔可以用 excel 或 google 表單開啟")
 if not final_selected.empty:
+    # 同一份勾選 (同一版資料 + 同一組 id) 只產生一次，之後重跑直接拿快取
+    selection_key = (catalog.content_hash, tuple(sorted(final_selected['id'])))
+    files = get_export_files(selection_key, final_selected)
     c1, c2, c3 = st.columns(3)
     with c1:
-        cal_obj = Calendar()
-        for _, row in final_selected.iterrows():
-            e = Event()
-            e.name = f"{row['活動名稱']} ({row['地點']})"
-            if row['start_dt']: e.begin = row['start_dt'] - timedelta(hours=8)
-            if row['end_dt']: e.end = row['end_dt'] - timedelta(hours=8)
-            e.location = str(row['地點'])
-            cal_obj.events.add(e)
-        st.download_button("下載google行事曆 (.ics)", data=cal_obj.serialize(), file_name="tibe_2026.ics", mime="text/calendar")
+        st.download_button("下載google行事曆 (.ics)", data=files["ics"], file_name="tibe_2026.ics", mime="text/calendar")
     
     with c2:
-        cols = ["日期", "時間", "活動名稱", "地點", "備註"]
-        v_cols = [c for c in cols if c in final_selected.columns]
-        csv_data = final_selected[v_cols].to_csv(index=False).encode('utf-8-sig')
-        st.download_button("下載表格 (.csv)", data=csv_data, file_name="tibe.csv", mime="text/csv")
+        st.download_button("下載表格 (.csv)", data=files["csv"], file_name="tibe.csv", mime="text/csv")
 
     with c3:
-        txt = ""
-        for _, row in final_selected.sort_values(by=['日期','時間']).iterrows():
-            txt += f"{row['日期']} {row['時間']} | {row['活動名稱']} @ {row['地點']}\n"
-        st.download_button("下載文字檔 (.txt)", data=txt, file_name="tibe.txt", mime="text/plain")
+        st.download_button("下載文字檔 (.txt)", data=files["txt"], file_name="tibe.txt", mime="text/plain")
+
+# --- 訂閱網址 (有架 feed_server.py 並設定 [feed] 時才顯示) ---
+feed = load_feed_settings()
+if not st.session_state.is_guest and feed.get("secret") and feed.get("base_url"):
+    st.caption("📡 訂閱行事曆：手機或 Google 日曆訂閱這個網址後，之後儲存的行程會自動同步，不用再重新匯入")
+    st.code(feed_url(feed["base_url"], feed["secret"], st.session_state.user_id), language=None)
 
 # ==========================================
 # 隱私權與資料聲明